@@ -1,15 +1,93 @@
 #!/usr/bin/env python
-import os, re, json, time, datetime, threading, sys, termios, fcntl
+import os, re, json, time, datetime, threading, sys, termios, fcntl, heapq, copy, struct, errno, select, math, subprocess, collections, signal, timeit, atexit, marshal, bisect, array, itertools
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    from Queue import Queue, Full as QueueFull
+except ImportError:
+    from queue import Queue, Full as QueueFull
+try:
+    from shlex import quote as shell_quote
+except ImportError:
+    from pipes import quote as shell_quote
 
 #global variables
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 CONFIGURATION_FILE = os.path.join(DIR_PATH, '.time-wizard/config.json')
 KANBAN_FILE = os.path.join(DIR_PATH, '.time-wizard/kanban.json')
+KANBAN_DATABASE_FILE = os.path.join(DIR_PATH, '.time-wizard/kanban.db')
+# named kanbans (kanban:<name> argument), one file per project. "default" is KANBAN_FILE (or KANBAN_DATABASE_FILE), "all" is every kanban merged
+KANBAN_DIRECTORY = os.path.join(DIR_PATH, '.time-wizard/kanbans')
+KANBAN_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_\-]+$')
+# where a key of command arguments starts (e.g: ", board:"), the value runs until the next key
+ARGUMENT_KEY_PATTERN = re.compile(r'(^|\s*,)\s*([a-z0-9_\-]*?)\s*:\s*')
+DEFAULT_KANBAN_NAME = 'default'
+MERGED_KANBAN_NAME = 'all'
+# processes parsing kanban files (without fresh snapshot) of the merged view at once
+KANBAN_LOAD_WORKER_COUNT = 4
+DAEMON_SOCKET_FILE = os.path.join(DIR_PATH, '.time-wizard/daemon.sock')
+STATUS_FILE = os.path.join(DIR_PATH, '.time-wizard/status.json')
+SESSION_LOG_FILE = os.path.join(DIR_PATH, '.time-wizard/sessions.log')
+SESSION_ROLLUP_FILE = os.path.join(DIR_PATH, '.time-wizard/sessions.json')
+# record of SESSION_LOG_FILE: timestamp, event (index of SESSION_EVENTS + 1), task id
+SESSION_RECORD = struct.Struct('<dBxxxI')
+SESSION_EVENTS = ('work', 'rest', 'pause', 'resume', 'stop', 'task')
+# SESSION_LOG_FILE is rotated into SESSION_LOG_FILE + '.1' once it is this big (in bytes)
+SESSION_LOG_MAX_SIZE = 1024 * 1024
+# how many days of records are kept by "stats compact:true"
+SESSION_LOG_KEEP_DAYS = 90
+# change it whenever the layout of kanban snapshot (KANBAN_FILE + '.cache') is changed
+KANBAN_SNAPSHOT_VERSION = 2
+# change it whenever the layout of kanban offsets (KANBAN_FILE + '.offsets') is changed
+KANBAN_OFFSETS_VERSION = 3
+# header of kanban offsets: version, kanban mtime, kanban size, kanban inode, boards offset, boards end, tasks end, member count, max task id, complete
+KANBAN_OFFSETS_HEADER = struct.Struct('<Idqqqqqqq?')
+# followed by a slot per task id: member offset, value offset, value end (-1 if there is no such task)
+KANBAN_OFFSETS_SLOT = struct.Struct('<ddd')
+# task ids smaller than this (or than 4 times the task count) have their slot, bigger ones are searched by reading kanban.json
+KANBAN_OFFSETS_MIN_SLOTS = 1024
+# kanban.json is read by chunks of this size (in bytes) when it is not loaded at once
+KANBAN_READ_CHUNK_SIZE = 64 * 1024
+# how far ahead reminders are listed by agenda without "to" argument
+AGENDA_DEFAULT_RANGE = 7 * 24 * 60 * 60
+# seconds between checks of kanban file in "kanban mode:watch" (inotify wakes it up earlier)
+KANBAN_WATCH_INTERVAL = 1
+# how many agenda lines are written at once
+AGENDA_BUFFER_SIZE = 256
+# how many table lines are written at once
+TABLE_BUFFER_SIZE = 256
+# rows of a kanban page when only page argument is given
+KANBAN_PAGE_SIZE = 50
+# up to this many reminders that are over are put back in place one by one, more are merged into the index at once
+KANBAN_INDEX_ROLL_LIMIT = 64
+# how far ahead reminders are precomputed for status
+STATUS_REMINDER_WINDOW = 24 * 60 * 60
+# set to 1 (or cprofile) to profile every command, same as profile:true (or profile:cprofile) argument
+PROFILE_ENVIRONMENT_VARIABLE = 'TIME_WIZARD_PROFILE'
+PROFILED_FUNCTIONS = ('load_json_file', 'save_json_file', 'get_reminded_tasks', 'beep', 'print_table', 'ReminderSchedule.update', 'ReminderSchedule.tick')
+# pomodoro iteration that starts later than this (in seconds) after the second boundary is counted as overrun
+PROFILE_OVERRUN_THRESHOLD = 0.05
+# remind_on styles of synthetic tasks used by bench
+BENCH_REMIND_ON_STYLES = ('none', 'once', 'daily', 'weekly', 'star')
+# seconds to wait for lock of a file being written by another process
+LOCK_TIMEOUT = 10
+# seconds to wait for the daemon before giving up
+DAEMON_TIMEOUT = 30
+# commands that are never forwarded to the daemon
+LOCAL_COMMANDS = ('pomodoro', 'daemon', 'bench', 'import-tasks', 'export-tasks', 'agenda', 'help', 'test', 'batch')
+# commands that keep running, or manage files on their own, can't be run by batch
+BATCH_EXCLUDED_COMMANDS = ('batch', 'pomodoro', 'daemon', 'bench', 'test', 'migrate-kanban', 'import-tasks')
 DAYS = [
-        ['monday', 'mon'], ['tuesday', 'tue'], ['wedday', 'wed'],
+        ['monday', 'mon'], ['tuesday', 'tue'], ['wednesday', 'wed'],
         ['thursday', 'thu'], ['friday', 'fri'], ['saturday', 'sat'], ['sunday', 'sun']
     ]
 DATE_SUFFIX = ['st', 'nd', 'rd', 'th']
+# words of task name, indexed for show-task/kanban name filter
+TASK_NAME_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+# how many years ahead a star pattern (e.g: *-02-29) is searched for it's next occurrence
+REMINDER_LOOKAHEAD_YEARS = 8
 DEFAULT_CONFIGURATION = {
         'work_time' : 25 * 60,
         'rest_time' : 5 * 60,
@@ -17,8 +95,24 @@ DEFAULT_CONFIGURATION = {
         'tick_sound_file' : os.path.join(DIR_PATH, '.time-wizard/tick.ogg'),
         'alarm_sound_file' : os.path.join(DIR_PATH, '.time-wizard/alarm.ogg'),
         'switch_sound_file' : os.path.join(DIR_PATH, '.time-wizard/switch.ogg'),
-        'play_tick' : True
+        'play_tick' : True,
+        'sound_backend' : 'auto', # auto, pygame, or command (sound_player)
+        'storage' : 'json', # json (KANBAN_FILE) or sqlite (KANBAN_DATABASE_FILE)
+        'status_format' : '{state} {counter} {reminders}', # available keys: state, counter, reminders, reminder_count, board_counts, task_count
+        'notification_sinks' : 'terminal,sound,tmux', # comma separated: terminal, sound, tmux (display-message), desktop (notify_command)
+        'notify_command' : 'notify-send "Time Wizard" %s'
     }
+# used when stdout is not a terminal and $LINES/$COLUMNS is not set
+DEFAULT_TERMINAL_SIZE = (24, 80)
+# how many sounds can wait for the audio player, the older ones are dropped
+AUDIO_QUEUE_SIZE = 4
+# threads delivering notifications, and how many deliveries can wait for them
+NOTIFICATION_WORKER_COUNT = 2
+NOTIFICATION_QUEUE_SIZE = 16
+# seconds before the same reminder can be notified again
+NOTIFICATION_RATE_LIMIT = 60
+# seconds before a notification command (e.g: notify_command) is killed
+NOTIFICATION_TIMEOUT = 5
 DEFAULT_KANBAN = {
         'tasks' : {},
         'boards' : {
@@ -35,8 +129,40 @@ DEFAULT_TASK = {
         'remind_for' : 30 * 60
     }
 
+TERMINAL_SIZE = None # (rows, cols), reset on SIGWINCH
+TERMINAL_SIZE_WATCHED = False
+
+def read_terminal_size():
+    try:
+        (rows, cols) = struct.unpack('hhhh', fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, b'\0' * 8))[:2]
+        if rows > 0 and cols > 0:
+            return (rows, cols)
+    except (IOError, OSError, ValueError, AttributeError): # not a terminal (e.g: piped)
+        pass
+    try:
+        return (int(os.environ.get('LINES', DEFAULT_TERMINAL_SIZE[0])), int(os.environ.get('COLUMNS', DEFAULT_TERMINAL_SIZE[1])))
+    except ValueError:
+        return DEFAULT_TERMINAL_SIZE
+
+def handle_terminal_resize(signum, frame):
+    global TERMINAL_SIZE
+    TERMINAL_SIZE = None
+
+def get_terminal_size():
+    global TERMINAL_SIZE, TERMINAL_SIZE_WATCHED
+    if not TERMINAL_SIZE_WATCHED:
+        TERMINAL_SIZE_WATCHED = True
+        try:
+            signal.signal(signal.SIGWINCH, handle_terminal_resize)
+        except ValueError: # not in main thread, can't be cached
+            TERMINAL_SIZE_WATCHED = False
+            return read_terminal_size()
+    if TERMINAL_SIZE is None:
+        TERMINAL_SIZE = read_terminal_size()
+    return TERMINAL_SIZE
+
 def get_terminal_col_size():
-    return int(os.popen('stty size', 'r').read().split()[1])
+    return get_terminal_size()[1]
 
 def is_string_or_unicode(value):
     return type(value) in (str, unicode)
@@ -79,25 +205,439 @@ def generate_dictionary_id(dictionary):
     return max(keys)+1 if len(keys) > 0 else 1
 
 def get_board_id(board):
-    kanban = load_kanban()
-    boards = kanban['boards']
-    board = str(board)
-    if board in boards.keys(): # by id
-        return board
-    else: # by caption
-        board = board.lower().replace(' ', '')
-        board_id = [x for x in boards.keys() if boards[x].lower().replace(' ', '') == board]
-        if len(board_id) > 0:
-            return str(board_id[0])
-    # by default return the first key
-    for board in boards.keys():
-        return board
-    return ''
+    return open_storage().get_board_id(board)
+
+class FileWatcher(object):
+    '''
+    inotify (linux only) based watcher, used to invalidate JSON_FILE_CACHE without stat-ing the files
+    '''
+    IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x2, 0x8, 0x40, 0x80, 0x100, 0x200
+    IN_NONBLOCK, IN_CLOEXEC = 0o4000, 0o2000000
+
+    def __init__(self):
+        import ctypes, ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.directories = {} # watch descriptor : directory
+
+    def watch(self, file_name):
+        directory = os.path.dirname(os.path.abspath(file_name))
+        if directory in self.directories.values():
+            return True
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        wd = self.libc.inotify_add_watch(self.fd, directory.encode(sys.getfilesystemencoding() or 'utf-8'), mask)
+        if wd < 0:
+            return False
+        self.directories[wd] = directory
+        return True
+
+    def is_watched(self, file_name):
+        return os.path.dirname(os.path.abspath(file_name)) in self.directories.values()
+
+    def poll(self):
+        '''
+        Return set of changed file names since the last poll
+        '''
+        changed_files = set()
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            offset = 0
+            while offset < len(buffer):
+                (wd, mask, cookie, length) = struct.unpack_from('iIII', buffer, offset)
+                name = buffer[offset + 16 : offset + 16 + length].rstrip(b'\0')
+                offset += 16 + length
+                if wd in self.directories:
+                    changed_files.add(os.path.join(self.directories[wd], name.decode(sys.getfilesystemencoding() or 'utf-8')))
+        return changed_files
+
+FILE_LOCKS = {} # lock file name : [lock file, depth]
+
+class FileLock(object):
+    '''
+    Exclusive advisory lock (fcntl.flock) of file_name, used as context manager. The lock is taken on file_name + '.lock',
+    since file_name itself is replaced on every save. It can be nested, only the outermost one really (un)locks
+    '''
+
+    def __init__(self, file_name, timeout=LOCK_TIMEOUT):
+        self.lock_file_name = os.path.abspath(os.path.expanduser(file_name)) + '.lock'
+        self.timeout = timeout
+
+    def __enter__(self):
+        if self.lock_file_name in FILE_LOCKS:
+            FILE_LOCKS[self.lock_file_name][1] += 1
+            return self
+        lock_file = open(self.lock_file_name, 'a')
+        deadline = time.time() + self.timeout
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except (IOError, OSError) as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+                    lock_file.close()
+                    raise
+            if time.time() >= deadline:
+                lock_file.close()
+                raise IOError(errno.ETIMEDOUT, 'Timeout while waiting for lock', self.lock_file_name)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        FILE_LOCKS[self.lock_file_name] = [lock_file, 1]
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        held = FILE_LOCKS[self.lock_file_name]
+        held[1] -= 1
+        if held[1] == 0:
+            FILE_LOCKS.pop(self.lock_file_name, None)
+            fcntl.flock(held[0].fileno(), fcntl.LOCK_UN)
+            held[0].close()
+        return False
+
+JSON_FILE_CACHE = {} # file_name : (signature, dictionary)
+FILE_WATCHER = None
+
+def enable_file_watcher():
+    '''
+    Invalidate JSON_FILE_CACHE by inotify instead of stat-ing the file on every load. Return the watcher or None if not available
+    '''
+    global FILE_WATCHER
+    if FILE_WATCHER is None and sys.platform.startswith('linux'):
+        try:
+            FILE_WATCHER = FileWatcher()
+        except (OSError, AttributeError):
+            FILE_WATCHER = None
+    return FILE_WATCHER
+
+def poll_file_watcher():
+    '''
+    Drop JSON_FILE_CACHE entries reported by FILE_WATCHER that has really been changed
+    '''
+    for file_name in FILE_WATCHER.poll():
+        cached = JSON_FILE_CACHE.get(file_name)
+        if cached is not None and cached[0] != get_file_signature(file_name):
+            JSON_FILE_CACHE.pop(file_name, None)
+
+def get_file_signature(file_name):
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size, stat.st_ino)
+
+def load_cached_json_file(file_name, load_function, copy_function):
+    '''
+    Return copy of load_function() result, only re-run load_function if file_name has been changed (mtime, size, inode)
+    '''
+    file_name = os.path.abspath(os.path.expanduser(file_name))
+    if FILE_WATCHER is not None:
+        poll_file_watcher()
+        cached = JSON_FILE_CACHE.get(file_name)
+        if cached is not None and FILE_WATCHER.is_watched(file_name):
+            return copy_function(cached[1])
+        FILE_WATCHER.watch(file_name)
+    else:
+        cached = JSON_FILE_CACHE.get(file_name)
+    signature = get_file_signature(file_name)
+    if cached is None or cached[0] != signature:
+        cached = (signature, load_function())
+        JSON_FILE_CACHE[file_name] = cached
+    return copy_function(cached[1])
+
+def store_cached_json_file(file_name, dictionary, copy_function):
+    '''
+    Write dictionary to file_name and through to JSON_FILE_CACHE, so that the next load doesn't do any I/O
+    '''
+    save_json_file(file_name, dictionary)
+    update_json_file_cache(file_name, dictionary, copy_function)
+
+def update_json_file_cache(file_name, value, copy_function):
+    file_name = os.path.abspath(os.path.expanduser(file_name))
+    JSON_FILE_CACHE[file_name] = (get_file_signature(file_name), copy_function(value))
+
+def copy_configuration(configuration):
+    return dict(configuration)
+
+def copy_kanban(kanban):
+    return kanban.copy()
+
+class Task(object):
+    '''
+    Validated task. Tasks are shared between the cache and every reader, so they are never modified, replace them instead.
+    task['name'] works as well as task.name, so a task can be read like the dictionary stored in kanban.json
+    '''
+    __slots__ = ('id', 'name', 'board', 'remind_on', 'remind_for')
+
+    def __init__(self, id, name, board, remind_on, remind_for):
+        (self.id, self.name, self.board, self.remind_on, self.remind_for) = (id, name, board, remind_on, remind_for)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    @staticmethod
+    def from_dictionary(id, dictionary, strings=None):
+        '''
+        Validate dictionary (e.g: a task from kanban.json) into Task. Repeated strings are shared through strings
+        '''
+        strings = {} if strings is None else strings
+        if not is_dict(dictionary):
+            dictionary = {}
+        name = dictionary.get('name', DEFAULT_TASK['name'])
+        board = dictionary.get('board', DEFAULT_TASK['board'])
+        remind_on = dictionary.get('remind_on', DEFAULT_TASK['remind_on'])
+        remind_for = dictionary.get('remind_for', DEFAULT_TASK['remind_for'])
+        if not is_string_or_unicode(name):
+            name = DEFAULT_TASK['name']
+        if not is_string_or_unicode(board):
+            board = str(board) if is_numeric(board) else DEFAULT_TASK['board']
+        if not is_string_or_unicode(remind_on):
+            remind_on = DEFAULT_TASK['remind_on']
+        if not is_numeric(remind_for):
+            remind_for = DEFAULT_TASK['remind_for']
+        return Task(id, name, strings.setdefault(board, board), strings.setdefault(remind_on, remind_on), remind_for)
+
+    def as_dictionary(self):
+        return {'name' : self.name, 'board' : self.board, 'remind_on' : self.remind_on, 'remind_for' : self.remind_for}
+
+def validate_boards(boards):
+    boards = boards if is_dict(boards) else DEFAULT_KANBAN['boards']
+    return {str(id) : boards[id] if is_string_or_unicode(boards[id]) else str(boards[id]) for id in boards}
+
+class KanbanStore(object):
+    '''
+    Validated kanban in memory: board names and Task objects, both keyed by id
+    '''
+    __slots__ = ('boards', 'tasks', 'strings', 'index')
+
+    def __init__(self, boards=None, tasks=None, strings=None, index=None):
+        self.boards = {} if boards is None else boards
+        self.tasks = {} if tasks is None else tasks
+        self.strings = {} if strings is None else strings # interned ids, boards, and remind_on
+        self.index = index # KanbanIndex, shared with the copies until one of them is changed
+
+    @staticmethod
+    def from_dictionary(dictionary):
+        '''
+        Validate kanban dictionary (e.g: content of kanban.json), this is the only place where tasks are validated
+        '''
+        store = KanbanStore()
+        if not is_dict(dictionary):
+            dictionary = {}
+        store.boards = validate_boards(dictionary.get('boards'))
+        tasks = dictionary.get('tasks')
+        tasks = tasks if is_dict(tasks) else DEFAULT_KANBAN['tasks']
+        for id in tasks:
+            if tasks[id] is None: # deleted by patch_kanban_file
+                continue
+            task = Task.from_dictionary(str(id), tasks[id], store.strings)
+            compile_remind_on(task.remind_on)
+            store.tasks[task.id] = task
+        return store
+
+    def as_dictionary(self):
+        tasks = self.tasks
+        return {'boards' : dict(self.boards), 'tasks' : {id : tasks[id].as_dictionary() for id in tasks}}
+
+    def copy(self):
+        # tasks are never modified, so copying the mappings is enough. The index is created here (its parts are built on first use),
+        # so that the parts built by a copy are kept by this kanban (e.g: the cached one) and shared with the next copies
+        return KanbanStore(dict(self.boards), dict(self.tasks), self.strings, self.get_index())
+
+    def get_index(self):
+        if self.index is None:
+            self.index = KanbanIndex(self.boards, self.tasks)
+        return self.index
+
+    def set_task(self, id, dictionary):
+        self.index = None
+        task = Task.from_dictionary(id, dictionary, self.strings)
+        compile_remind_on(task.remind_on)
+        self.tasks[task.id] = task
+        return task
+
+def match_task_name(name, words):
+    '''
+    Return True if every word (lower case token of name filter) is the beginning of a word in task name
+    '''
+    tokens = TASK_NAME_TOKEN_PATTERN.findall(name.lower())
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+class KanbanIndex(object):
+    '''
+    Indexes of a kanban, built on demand and kept until the kanban is changed: board id by caption, task ids by board,
+    task ids by name token (inverted index), and task ids ordered by their next reminder time
+    '''
+
+    def __init__(self, boards, tasks):
+        # own copies, the kanban might be changed after the index has been built
+        (self.boards, self.tasks) = (dict(boards), dict(tasks))
+        self.ids = None
+        self.board_id_map = None
+        self.board_tasks = None # board id : list of task ids
+        self.tokens = None # token : list of task ids
+        self.token_list = None # sorted tokens, searched by prefix
+        # (list of time_start, list of task ids, {task id : time_start}, task ids ordered by id, list of (time_start, int id, id),
+        # heap of (time_stop, id), int ids ordered), the first two and the last two are parallel lists
+        self.reminders = None
+
+    def get_ids(self):
+        if self.ids is None:
+            self.ids = sorted(self.tasks, key = lambda key: int(key))
+        return self.ids
+
+    def get_board_id_map(self):
+        if self.board_id_map is None:
+            self.board_id_map = get_board_id_map(self.boards)
+        return self.board_id_map
+
+    def get_board_tasks(self):
+        if self.board_tasks is None:
+            self.board_tasks = {}
+            for id in self.get_ids():
+                self.board_tasks.setdefault(self.tasks[id].board, []).append(id)
+        return self.board_tasks
+
+    def get_token_ids(self, word):
+        '''
+        Return ids (ordered by id) of tasks having a name token starting with word (lower case)
+        '''
+        if self.tokens is None:
+            self.tokens = {}
+            for id in self.get_ids():
+                for token in set(TASK_NAME_TOKEN_PATTERN.findall(self.tasks[id].name.lower())):
+                    self.tokens.setdefault(token, []).append(id)
+            self.token_list = sorted(self.tokens)
+        matches = []
+        index = bisect.bisect_left(self.token_list, word)
+        while index < len(self.token_list) and self.token_list[index].startswith(word):
+            matches.append(self.tokens[self.token_list[index]])
+            index += 1
+        if len(matches) == 1:
+            return matches[0]
+        return sorted(set(id for ids in matches for id in ids), key = lambda key: int(key))
+
+    def get_reminders(self, current_time):
+        '''
+        Return (list of time_start, list of task ids, {task id : time_start}, task ids ordered by id) of the next reminder of every task,
+        ordered by time_start. It is built once, then only the reminders that are over are rolled forward to the next one of their task
+        and put back in place by bisection, so the cost follows the number of reminders that are over rather than the size of the kanban
+        '''
+        if self.reminders is None:
+            occurrences = {} # remind_on and remind_for shared by many tasks are computed once
+            (entries, expiries) = ([], [])
+            for id in self.get_ids():
+                task = self.tasks[id]
+                key = (task.remind_on, task.remind_for)
+                if key not in occurrences:
+                    occurrences[key] = get_next_reminder_time(task.remind_on, task.remind_for, current_time)
+                if occurrences[key] is not None:
+                    entries.append((occurrences[key][0], int(id), id))
+                    expiries.append((occurrences[key][1], id))
+            entries.sort()
+            heapq.heapify(expiries)
+            reminder_times = {x[2] : x[0] for x in entries}
+            reminder_ids = [id for id in self.get_ids() if id in reminder_times]
+            self.reminders = ([x[0] for x in entries], [x[2] for x in entries], reminder_times, reminder_ids, entries, expiries,
+                    [int(id) for id in reminder_ids])
+        (times, ids, reminder_times, reminder_ids, entries, expiries, reminder_keys) = self.reminders
+        expired = []
+        while len(expiries) > 0 and expiries[0][0] <= current_time:
+            expired.append(heapq.heappop(expiries)[1])
+        if len(expired) == 0:
+            return self.reminders[:4]
+        occurrences = {}
+        (rolled, gone) = ([], []) # next reminder of the expired tasks, expired one time reminders
+        for id in expired:
+            task = self.tasks[id]
+            key = (task.remind_on, task.remind_for)
+            if key not in occurrences:
+                occurrences[key] = get_next_reminder_time(task.remind_on, task.remind_for, current_time)
+            if occurrences[key] is None:
+                gone.append(id)
+            else:
+                rolled.append((occurrences[key][0], int(id), id))
+                heapq.heappush(expiries, (occurrences[key][1], id))
+        if len(expired) <= KANBAN_INDEX_ROLL_LIMIT:
+            for id in expired:
+                index = bisect.bisect_left(entries, (reminder_times[id], int(id), id))
+                del entries[index], times[index], ids[index]
+            for id in gone:
+                index = bisect.bisect_left(reminder_keys, int(id))
+                del reminder_keys[index], reminder_ids[index]
+            for entry in rolled:
+                index = bisect.bisect_left(entries, entry)
+                entries.insert(index, entry)
+                times.insert(index, entry[0])
+                ids.insert(index, entry[2])
+        else: # a single pass, the lists are changed in place since they are shared
+            expired_ids = set(expired)
+            entries[:] = sorted([x for x in entries if x[2] not in expired_ids] + rolled) # the kept entries are one sorted run already
+            times[:] = [x[0] for x in entries]
+            ids[:] = [x[2] for x in entries]
+            if len(gone) > 0:
+                gone_ids = set(gone)
+                reminder_ids[:] = [id for id in reminder_ids if id not in gone_ids]
+                reminder_keys[:] = [int(id) for id in reminder_ids]
+        for id in gone:
+            del reminder_times[id]
+        for entry in rolled:
+            reminder_times[entry[2]] = entry[0]
+        return self.reminders[:4]
+
+    def query(self, board=None, name=None, due_after=None, due_before=None, has_reminder=None, offset=0, limit=None, current_time=None):
+        '''
+        Return ids (ordered by id) of tasks matching every given filter. The candidates are taken from the most selective index,
+        the other filters are checked on the candidates only, so the cost follows the size of the result rather than of the kanban
+        '''
+        current_time = time.time() if current_time is None else current_time
+        words = TASK_NAME_TOKEN_PATTERN.findall(name.lower()) if name else [] # match the beginning of name tokens
+        candidates = [] # list of ids ordered by id
+        if board is not None:
+            candidates.append(self.get_board_tasks().get(board, []))
+        for word in words:
+            candidates.append(self.get_token_ids(word))
+        reminder_times = None
+        if due_after is not None or due_before is not None or has_reminder is not None:
+            (times, ids, reminder_times, reminder_ids) = self.get_reminders(current_time)
+            if due_after is not None or due_before is not None:
+                low = bisect.bisect_left(times, due_after) if due_after is not None else 0
+                high = bisect.bisect_left(times, due_before) if due_before is not None else len(times)
+                candidates.append(sorted(ids[low:high], key = lambda key: int(key)))
+            elif has_reminder:
+                candidates.append(reminder_ids)
+        ids = min(candidates, key = len) if len(candidates) > 0 else self.get_ids()
+        result = []
+        stop = offset + limit if limit is not None else None
+        for id in ids:
+            task = self.tasks[id]
+            if board is not None and task.board != board:
+                continue
+            if len(words) > 0 and not match_task_name(task.name, words):
+                continue
+            if reminder_times is not None:
+                time_start = reminder_times.get(id)
+                if has_reminder is not None and (time_start is not None) != has_reminder:
+                    continue
+                if due_after is not None and (time_start is None or time_start < due_after):
+                    continue
+                if due_before is not None and (time_start is None or time_start >= due_before):
+                    continue
+            result.append(id)
+            if stop is not None and len(result) >= stop:
+                break
+        return result[offset:stop]
 
 def load_json_file(file_name, validator, default_dictionary):
     file_name = os.path.expanduser(file_name)
     # get default dictionary
-    dictionary = default_dictionary
+    dictionary = copy.deepcopy(default_dictionary)
     # get dictionary from file if exists
     if os.path.exists(file_name):
         with open(file_name, 'r') as infile:
@@ -106,9 +646,26 @@ def load_json_file(file_name, validator, default_dictionary):
     return validate_dictionary(dictionary, validator, default_dictionary)
 
 def save_json_file(file_name, dictionary):
-    with open(file_name, 'w+') as outfile:
-        json.dump(dictionary, outfile)
+    save_file(file_name, lambda outfile: json.dump(dictionary, outfile))
 
+def save_file(file_name, write_function):
+    '''
+    Replace file_name by a fully written (by write_function) and fsync-ed temporary file while holding it's lock,
+    so that readers never see half written file and writers never interleave. Return the result of write_function
+    '''
+    file_name = os.path.expanduser(file_name)
+    temporary_file_name = '%s.%d.tmp' %(file_name, os.getpid())
+    with FileLock(file_name):
+        try:
+            with open(temporary_file_name, 'wb') as outfile:
+                result = write_function(outfile)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            os.rename(temporary_file_name, file_name)
+        finally:
+            if os.path.exists(temporary_file_name):
+                os.remove(temporary_file_name)
+    return result
 
 def load_configuration():
     validator = {
@@ -119,42 +676,679 @@ def load_configuration():
             'alarm_sound_file' : is_string_or_unicode,
             'switch_sound_file' : is_string_or_unicode,
             'play_tick' : is_boolean_value,
+            'sound_backend' : is_string_or_unicode,
+            'storage' : is_string_or_unicode,
+            'status_format' : is_string_or_unicode,
+            'notification_sinks' : is_string_or_unicode,
+            'notify_command' : is_string_or_unicode,
         }
-    return load_json_file(CONFIGURATION_FILE, validator, DEFAULT_CONFIGURATION)
+    load_function = lambda: load_cached_json_file(CONFIGURATION_FILE, lambda: load_json_file(CONFIGURATION_FILE, validator, DEFAULT_CONFIGURATION), copy_configuration)
+    if BATCH is not None:
+        return BATCH.get_configuration(load_function)
+    return load_function()
+
+def get_kanban_snapshot_file_name(file_name):
+    return file_name + '.cache'
+
+def save_kanban_snapshot(file_name, signature, kanban):
+    '''
+    Write validated kanban (and compiled remind_on) next to file_name as marshal data, keyed by file_name's mtime, size and inode.
+    Repeated board ids and remind_on are stored once, tasks refer to them by index
+    '''
+    if signature is None:
+        return
+    (board_values, remind_on_values) = ({}, {})
+    (ids, names, board_indexes, remind_on_indexes, remind_fors) = ([], [], [], [], [])
+    for id in kanban.tasks:
+        task = kanban.tasks[id]
+        ids.append(task.id)
+        names.append(task.name)
+        board_indexes.append(board_values.setdefault(task.board, len(board_values)))
+        remind_on_indexes.append(remind_on_values.setdefault(task.remind_on, len(remind_on_values)))
+        remind_fors.append(task.remind_for)
+    board_table = sorted(board_values, key = lambda value: board_values[value])
+    remind_on_table = sorted(remind_on_values, key = lambda value: remind_on_values[value])
+    rule_table = []
+    for remind_on in remind_on_table:
+        rule = compile_remind_on(remind_on)
+        rule_table.append((rule.kind, rule.hour, rule.minute, rule.second, rule.year, rule.month, rule.day, rule.weekday) if rule is not None else None)
+    snapshot = (KANBAN_SNAPSHOT_VERSION, tuple(sys.version_info[:2]), tuple(signature), list(kanban.boards.items()),
+            ids, names, board_indexes, remind_on_indexes, remind_fors, board_table, remind_on_table, rule_table)
+    snapshot_file_name = get_kanban_snapshot_file_name(file_name)
+    temporary_file_name = '%s.%d.tmp' %(snapshot_file_name, os.getpid())
+    try:
+        with open(temporary_file_name, 'wb') as outfile:
+            outfile.write(marshal.dumps(snapshot))
+        os.rename(temporary_file_name, snapshot_file_name)
+    except (IOError, OSError, ValueError): # it is just a cache
+        pass
+
+def load_kanban_snapshot(file_name, signature):
+    '''
+    Return KanbanStore from the snapshot of file_name without parsing nor validating, or None if the snapshot is stale or corrupted
+    '''
+    if signature is None:
+        return None
+    try:
+        with open(get_kanban_snapshot_file_name(file_name), 'rb') as infile:
+            snapshot = marshal.loads(infile.read())
+        (version, python_version, snapshot_signature, board_items, ids, names, board_indexes, remind_on_indexes, remind_fors,
+                board_table, remind_on_table, rule_table) = snapshot
+    except (IOError, OSError, EOFError, ValueError, TypeError): # not exists or corrupted
+        return None
+    if version != KANBAN_SNAPSHOT_VERSION or python_version != tuple(sys.version_info[:2]) or tuple(snapshot_signature) != tuple(signature):
+        return None
+    for (remind_on, rule) in zip(remind_on_table, rule_table):
+        if remind_on not in REMINDER_RULE_CACHE:
+            REMINDER_RULE_CACHE[remind_on] = ReminderRule(*rule) if rule is not None else None
+    strings = {value : value for value in board_table + remind_on_table}
+    tasks = {}
+    for (id, name, board_index, remind_on_index, remind_for) in zip(ids, names, board_indexes, remind_on_indexes, remind_fors):
+        tasks[id] = Task(id, name, board_table[board_index], remind_on_table[remind_on_index], remind_for)
+    return KanbanStore(dict(board_items), tasks, strings)
+
+class KanbanFileReader(object):
+    '''
+    Incremental JSON reader: values are decoded one by one from a buffer that is refilled by chunks (KANBAN_READ_CHUNK_SIZE),
+    and their byte offsets in the file are kept, so that memory follows the size of a value instead of the size of the file
+    '''
+    WHITESPACE_PATTERN = re.compile(r'[ \t\n\r]*')
+    KEY_PATTERN = re.compile(r'[ \t\n\r]*"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*')
+    SEPARATOR_PATTERN = re.compile(r'[ \t\n\r]*([,}])')
+
+    def __init__(self, infile):
+        self.infile = infile
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0 # in buffer
+        self.offset = 0 # of buffer in the file
+
+    def tell(self):
+        return self.offset + self.position
+
+    def fill(self):
+        '''
+        Read the next chunk, return False at the end of the file. The chunk grows with the buffer, so that a huge value is still read in linear time
+        '''
+        chunk = self.infile.read(max(KANBAN_READ_CHUNK_SIZE, len(self.buffer) - self.position))
+        if chunk == '':
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.offset += self.position
+        self.position = 0
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            self.position = self.WHITESPACE_PATTERN.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or not self.fill():
+                return
+
+    def peek(self):
+        self.skip_whitespace()
+        return self.buffer[self.position] if self.position < len(self.buffer) else ''
+
+    def match(self, pattern):
+        '''
+        Match pattern at the current position, reading more if the match might continue in the next chunk
+        '''
+        while True:
+            match = pattern.match(self.buffer, self.position)
+            if (match is not None and match.end() < len(self.buffer)) or not self.fill():
+                return match
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError('Expecting %s at %d' %(character, self.tell()))
+        self.position += 1
+
+    def decode(self):
+        '''
+        Return (value, offset, end) of the JSON value at the current position
+        '''
+        self.skip_whitespace()
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buffer, self.position)
+                # a number at the end of the buffer might continue in the next chunk
+                if end < len(self.buffer) or not self.fill():
+                    break
+            except ValueError:
+                if not self.fill():
+                    raise
+        offset = self.tell()
+        self.position = end
+        return (value, offset, self.tell())
+
+    def iter_keys(self):
+        '''
+        Yield (key, member offset) of the object at the current position. The value should be read (decode or iter_keys) before the next key
+        '''
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            match = self.match(self.KEY_PATTERN)
+            if match is None:
+                raise ValueError('Expecting key at %d' %(self.tell(),))
+            member_offset = self.offset + match.start(1) - 1
+            key = match.group(1)
+            self.position = match.end()
+            yield (json.loads('"%s"' %(key,)) if '\\' in key else key.decode('utf-8'), member_offset)
+            match = self.match(self.SEPARATOR_PATTERN)
+            if match is None:
+                raise ValueError('Expecting , or } at %d' %(self.tell(),))
+            self.position = match.end()
+            if match.group(1) == '}':
+                return
+
+def iter_kanban_members(infile):
+    '''
+    Yield (section, id, value, member offset, value offset, value end) of every board and task of kanban.json in file order,
+    followed by (section, None, None, object offset, object offset, object end) once the whole boards/tasks object is read
+    '''
+    reader = KanbanFileReader(infile)
+    for (section, section_offset) in reader.iter_keys():
+        if section not in ('boards', 'tasks') or reader.peek() != '{':
+            reader.decode()
+            continue
+        object_offset = reader.tell()
+        for (id, member_offset) in reader.iter_keys():
+            (value, value_offset, value_end) = reader.decode()
+            yield (section, id, value, member_offset, value_offset, value_end)
+        yield (section, None, None, object_offset, object_offset, reader.tell())
+
+def iter_kanban_tasks(file_name):
+    '''
+    Yield (id, Task) of every task in kanban.json in file order, validated one by one while the file is read
+    '''
+    if not os.path.exists(file_name):
+        return
+    strings = {}
+    with open(file_name, 'rb') as infile:
+        for (section, id, value, member_offset, value_offset, value_end) in iter_kanban_members(infile):
+            if section == 'tasks' and id is not None and value is not None:
+                yield (str(id), Task.from_dictionary(str(id), value, strings))
+
+def get_kanban_offsets_file_name(file_name):
+    return file_name + '.offsets'
+
+class KanbanOffsets(object):
+    '''
+    Where the boards, the end of tasks, and every task (slot = task id) are in kanban.json. It is stored next to the file
+    (KANBAN_FILE + '.offsets'), so that boards or a single task is read by a seek instead of parsing the whole file.
+    Complete means every task has it's slot, so a task without slot doesn't exist
+    '''
+
+    def __init__(self, boards_offset=-1, boards_end=-1, tasks_end=-1, member_count=0, max_id=0, complete=True, slots=None):
+        (self.boards_offset, self.boards_end, self.tasks_end) = (boards_offset, boards_end, tasks_end)
+        self.member_count = member_count # including null tasks (deleted by older versions)
+        self.max_id = max_id # biggest id of a task, the next task gets max_id + 1 just like generate_dictionary_id gives
+        self.complete = complete
+        self.slots = array.array('d') if slots is None else slots # (member offset, value offset, value end) of every id, or {id : slot} if partly loaded
+
+    def get_slot_limit(self):
+        return max(KANBAN_OFFSETS_MIN_SLOTS, 4 * self.member_count)
+
+    def get(self, id):
+        if type(self.slots) == dict:
+            return self.slots.get(id)
+        if not id.isdigit() or 3 * int(id) + 3 > len(self.slots):
+            return None
+        slot = self.slots[3 * int(id) : 3 * int(id) + 3]
+        return (int(slot[0]), int(slot[1]), int(slot[2])) if slot[0] >= 0 else None
+
+    def set(self, id, slot):
+        '''
+        Set slot of id, return False if id can't have a slot (not a number or too big)
+        '''
+        if not id.isdigit() or int(id) >= self.get_slot_limit():
+            return False
+        (slots, index) = (self.slots, 3 * int(id))
+        if index + 3 > len(slots):
+            slots.extend([-1.0] * (index + 3 - len(slots)))
+        (slots[index], slots[index + 1], slots[index + 2]) = slot
+        self.max_id = max(self.max_id, int(id))
+        return True
+
+    def remove(self, id):
+        if self.get(id) is not None:
+            self.slots[3 * int(id) : 3 * int(id) + 3] = array.array('d', [-1.0, -1.0, -1.0])
+            if int(id) == self.max_id: # the biggest id is deleted, find the next one
+                index = 3 * self.max_id
+                while index > 0 and self.slots[index] < 0:
+                    index -= 3
+                self.max_id = index // 3
+
+    def get_removal_splices(self, ids):
+        '''
+        Return splices (start, end, '') cutting the members of ids out of the tasks object. Every run of removed members
+        is cut together with the separator after it, or before it if it is the end of the object
+        '''
+        removed = set(ids)
+        members = sorted((int(self.slots[index]), int(self.slots[index + 2]), str(index // 3)) for index in range(0, len(self.slots), 3) if self.slots[index] >= 0)
+        (splices, index) = ([], 0)
+        while index < len(members):
+            if members[index][2] not in removed:
+                index += 1
+                continue
+            first = index
+            while index < len(members) and members[index][2] in removed:
+                index += 1
+            if index < len(members): # up to the next member
+                splices.append((members[first][0], members[index][0], ''))
+            elif first > 0: # from the end of the previous member
+                splices.append((members[first - 1][1], members[index - 1][1], ''))
+            else: # every member
+                splices.append((members[first][0], members[index - 1][1], ''))
+        return splices
+
+    def shift(self, splices):
+        '''
+        Move every offset after the splices (start, end, replacement) are applied. A replaced range shifts what starts from it's end,
+        an insertion (start == end) only shifts what comes after it, so that the end of the value before it stays
+        '''
+        (ends, deltas, total) = ([], [], 0)
+        for (start, end, replacement) in sorted(splices):
+            if len(replacement) == end - start: # padded, nothing moves
+                continue
+            total += len(replacement) - (end - start)
+            ends.append(end + 0.5 if start == end else end)
+            deltas.append(total)
+        if len(ends) == 0:
+            return
+        def move(offset):
+            index = bisect.bisect_right(ends, offset)
+            return offset + deltas[index - 1] if index > 0 else offset
+        for name in ('boards_offset', 'boards_end', 'tasks_end'):
+            if getattr(self, name) >= 0:
+                setattr(self, name, move(getattr(self, name)))
+        (slots, first_end) = (self.slots, ends[0])
+        if len(ends) == 1: # the usual single change
+            delta = deltas[0]
+            for index in range(len(slots)):
+                if slots[index] >= first_end:
+                    slots[index] += delta
+            return
+        for index in range(len(slots)):
+            if slots[index] >= first_end:
+                slots[index] = move(slots[index])
+
+def save_kanban_offsets(file_name, signature, offsets):
+    if signature is None:
+        return
+    offsets_file_name = get_kanban_offsets_file_name(file_name)
+    temporary_file_name = '%s.%d.tmp' %(offsets_file_name, os.getpid())
+    try:
+        with open(temporary_file_name, 'wb') as outfile:
+            outfile.write(KANBAN_OFFSETS_HEADER.pack(KANBAN_OFFSETS_VERSION, signature[0], signature[1], signature[2], offsets.boards_offset, offsets.boards_end,
+                offsets.tasks_end, offsets.member_count, offsets.max_id, offsets.complete))
+            offsets.slots.tofile(outfile)
+        os.rename(temporary_file_name, offsets_file_name)
+    except (IOError, OSError): # it is just an index
+        pass
+
+def load_kanban_offsets(file_name, signature, ids=None):
+    '''
+    Return KanbanOffsets of file_name, or None if it is stale or corrupted. Only the slots of ids are read, unless ids is None
+    '''
+    if signature is None:
+        return None
+    try:
+        with open(get_kanban_offsets_file_name(file_name), 'rb') as infile:
+            header = KANBAN_OFFSETS_HEADER.unpack(infile.read(KANBAN_OFFSETS_HEADER.size))
+            if header[0] != KANBAN_OFFSETS_VERSION or header[1:4] != tuple(signature[:3]):
+                return None
+            offsets = KanbanOffsets(*header[4:])
+            if ids is None:
+                slot_count = (os.fstat(infile.fileno()).st_size - KANBAN_OFFSETS_HEADER.size) // KANBAN_OFFSETS_SLOT.size
+                offsets.slots.fromfile(infile, 3 * slot_count)
+                return offsets
+            offsets.slots = {}
+            for id in ids:
+                if id.isdigit():
+                    infile.seek(KANBAN_OFFSETS_HEADER.size + int(id) * KANBAN_OFFSETS_SLOT.size)
+                    slot = infile.read(KANBAN_OFFSETS_SLOT.size)
+                    if len(slot) == KANBAN_OFFSETS_SLOT.size and KANBAN_OFFSETS_SLOT.unpack(slot)[0] >= 0:
+                        offsets.slots[id] = tuple(int(x) for x in KANBAN_OFFSETS_SLOT.unpack(slot))
+            return offsets
+    except (IOError, OSError, EOFError, struct.error): # not exists or corrupted
+        return None
+
+def build_kanban_offsets(infile, file_name):
+    '''
+    Find every board and task of the opened kanban file by reading it once, return it's KanbanOffsets.
+    They are only saved if the lock of file_name is free (or held here) and file_name is still the opened file,
+    otherwise a writer is replacing the file and saves the offsets of the new one
+    '''
+    infile.seek(0)
+    signature = get_open_file_signature(infile)
+    offsets = KanbanOffsets()
+    slots = []
+    for (section, id, value, member_offset, value_offset, value_end) in iter_kanban_members(infile):
+        if id is None:
+            if section == 'boards':
+                (offsets.boards_offset, offsets.boards_end) = (value_offset, value_end)
+            else:
+                offsets.tasks_end = value_end - 1
+        elif section == 'tasks':
+            offsets.member_count += 1
+            slots.append((str(id), (member_offset, value_offset, value_end), value is not None))
+    for (id, slot, exists) in slots:
+        if not offsets.set(id, slot):
+            offsets.complete = False
+    # a null task doesn't count, like it doesn't when the kanban is loaded
+    offsets.max_id = max([int(id) for (id, slot, exists) in slots if exists and id.isdigit()] + [0])
+    try:
+        with FileLock(file_name, timeout = 0):
+            if get_file_signature(file_name) == signature:
+                save_kanban_offsets(file_name, signature, offsets)
+    except (IOError, OSError): # being written by another process
+        pass
+    return offsets
+
+def get_open_file_signature(infile):
+    stat = os.fstat(infile.fileno())
+    return (stat.st_mtime, stat.st_size, stat.st_ino)
+
+def get_kanban_offsets(infile, file_name, ids=None):
+    '''
+    Return KanbanOffsets of the opened kanban file (not of file_name, which might have been replaced since it was opened),
+    built (by reading the whole file once) if there is no fresh one
+    '''
+    offsets = load_kanban_offsets(file_name, get_open_file_signature(infile), ids)
+    if offsets is None:
+        offsets = build_kanban_offsets(infile, file_name)
+    return offsets
+
+def read_kanban_value(infile, slot):
+    infile.seek(slot[1])
+    return json.loads(infile.read(slot[2] - slot[1]))
+
+def read_kanban_boards(file_name):
+    '''
+    Return validated boards of kanban.json, read by a seek instead of parsing the tasks
+    '''
+    if not os.path.exists(file_name):
+        return validate_boards(None)
+    with open(file_name, 'rb') as infile:
+        offsets = get_kanban_offsets(infile, file_name, ())
+        if offsets is None or offsets.boards_offset < 0: # no boards in the file
+            return validate_boards(None)
+        return validate_boards(read_kanban_value(infile, (None, offsets.boards_offset, offsets.boards_end)))
+
+def read_kanban_task(file_name, id):
+    '''
+    Return validated Task of kanban.json, or None if it doesn't exist. The task is found by it's offset,
+    only a kanban with non numeric (or very sparse) task ids is read until the task is found
+    '''
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name, 'rb') as infile:
+        offsets = get_kanban_offsets(infile, file_name, (id,))
+        slot = offsets.get(id) if offsets is not None else None
+        if slot is not None:
+            value = read_kanban_value(infile, slot)
+            return Task.from_dictionary(id, value) if value is not None else None
+        if offsets is not None and offsets.complete:
+            return None
+    for (task_id, task) in iter_kanban_tasks(file_name):
+        if task_id == id:
+            return task
+    return None
+
+def get_kanban_max_task_id(file_name):
+    '''
+    Return the biggest task id of kanban.json from it's offsets, or None if it is unknown (offsets are not complete)
+    '''
+    if not os.path.exists(file_name):
+        return 0
+    with open(file_name, 'rb') as infile:
+        offsets = get_kanban_offsets(infile, file_name, ())
+    return offsets.max_id if offsets is not None and offsets.complete else None
+
+def write_kanban_file(outfile, kanban):
+    '''
+    Write kanban as JSON (boards first, then tasks ordered by id), return it's KanbanOffsets computed along the way
+    '''
+    offsets = KanbanOffsets()
+    tasks = kanban.tasks
+    ids = sorted(tasks, key = lambda key: (0, int(key), '') if key.isdigit() else (1, 0, key))
+    (prefix, separator) = ('{"boards": ', ', "tasks": {')
+    boards = json.dumps(kanban.boards)
+    (offsets.boards_offset, offsets.boards_end) = (len(prefix), len(prefix) + len(boards))
+    outfile.write(prefix + boards + separator)
+    position = offsets.boards_end + len(separator)
+    slots = []
+    for id in ids:
+        if len(slots) > 0:
+            outfile.write(', ')
+            position += 2
+        member = json.dumps(id) + ': '
+        value = json.dumps(tasks[id].as_dictionary())
+        slots.append((id, (position, position + len(member), position + len(member) + len(value))))
+        outfile.write(member + value)
+        position += len(member) + len(value)
+    outfile.write('}}')
+    (offsets.tasks_end, offsets.member_count) = (position, len(ids))
+    for (id, slot) in slots:
+        if not offsets.set(id, slot):
+            offsets.complete = False
+    return offsets
+
+def patch_kanban_file(file_name, changes):
+    '''
+    Apply task changes (add_task, edit_task, delete_task) to kanban.json by replacing only the bytes of the changed tasks, found by their offsets,
+    deleted tasks are cut out. Return False (nothing is written) if the offsets can't be used,
+    then the whole kanban should be saved instead. It should be called while holding the lock of file_name
+    '''
+    if not os.path.exists(file_name):
+        return False
+    with open(file_name, 'rb') as infile:
+        offsets = get_kanban_offsets(infile, file_name)
+        if offsets is None or not offsets.complete or offsets.tasks_end < 0:
+            return False
+        tasks = collections.OrderedDict() # id : dictionary or None (deleted), the final state of every changed task
+        def get_task(id):
+            if id in tasks:
+                return tasks[id]
+            slot = offsets.get(id)
+            value = read_kanban_value(infile, slot) if slot is not None else None
+            return Task.from_dictionary(id, value).as_dictionary() if value is not None else None
+        next_id = offsets.max_id + 1
+        for change in changes:
+            (method, id, value) = (change + (None,))[:3]
+            if method == 'add_task' and id is None:
+                while str(next_id) in tasks or offsets.get(str(next_id)) is not None:
+                    next_id += 1
+                id = str(next_id)
+            task = get_task(id)
+            if method == 'add_task' and task is None:
+                tasks[id] = Task.from_dictionary(id, value).as_dictionary()
+            elif method == 'edit_task' and task is not None:
+                task = dict(task)
+                task.update(value)
+                tasks[id] = Task.from_dictionary(id, task).as_dictionary()
+            elif method == 'delete_task' and task is not None:
+                tasks[id] = None
+            elif method == 'add_task':
+                print('Task with id %s already exists' %(id,))
+            else:
+                print('Task with id %s doesn\'t exists' %(id,))
+        (splices, replacements, additions) = ([], [], [])
+        removals = [id for id in tasks if tasks[id] is None and offsets.get(id) is not None]
+        for id in tasks:
+            slot = offsets.get(id)
+            if tasks[id] is None: # deleted
+                continue
+            value = json.dumps(tasks[id])
+            if slot is not None:
+                # shorter value is padded by spaces, so that the following offsets stay
+                splices.append((slot[1], slot[2], value.ljust(slot[2] - slot[1])))
+                replacements.append((id, len(value)))
+            else:
+                if not id.isdigit() or int(id) >= offsets.get_slot_limit():
+                    return False
+                additions.append((id, value))
+        if len(removals) > 0:
+            splices.extend(offsets.get_removal_splices(removals))
+            offsets.member_count -= len(removals)
+        # new tasks are inserted at the end of tasks object
+        (insertion, slots) = ('', [])
+        for (id, value) in additions:
+            member = '%s%s: ' %(', ' if offsets.member_count > 0 else '', json.dumps(id))
+            slots.append((id, len(insertion) + (2 if offsets.member_count > 0 else 0), len(insertion) + len(member), len(insertion) + len(member) + len(value)))
+            insertion += member + value
+            offsets.member_count += 1
+        if insertion != '':
+            splices.append((offsets.tasks_end, offsets.tasks_end, insertion))
+        def write(outfile):
+            infile.seek(0)
+            position = 0
+            for (start, end, replacement) in sorted(splices):
+                outfile.write(infile.read(start - position))
+                outfile.write(replacement)
+                infile.seek(end)
+                position = end
+            while True:
+                chunk = infile.read(KANBAN_READ_CHUNK_SIZE)
+                if chunk == '':
+                    break
+                outfile.write(chunk)
+        save_file(file_name, write)
+    offsets.shift(splices)
+    for id in removals:
+        offsets.remove(id)
+    for (id, length) in replacements:
+        (member_offset, value_offset, value_end) = offsets.get(id)
+        offsets.set(id, (member_offset, value_offset, value_offset + length))
+    insertion_offset = offsets.tasks_end
+    offsets.tasks_end += len(insertion)
+    for (id, member_offset, value_offset, value_end) in slots:
+        offsets.set(id, (insertion_offset + member_offset, insertion_offset + value_offset, insertion_offset + value_end))
+    save_kanban_offsets(file_name, get_file_signature(file_name), offsets)
+    return True
 
-def load_kanban():
+def load_kanban(file_name=None):
+    file_name = KANBAN_FILE if file_name is None else file_name
+    return load_cached_json_file(file_name, lambda: load_kanban_file(file_name), copy_kanban)
+
+def load_kanban_file(file_name):
+    signature = get_file_signature(file_name)
+    kanban = load_kanban_snapshot(file_name, signature)
+    if kanban is not None:
+        return kanban
     validator = {
             'tasks' : is_dict,
             'boards' : is_dict
         }
-    kanban = load_json_file(KANBAN_FILE, validator, DEFAULT_KANBAN)
-    # boards
-    for id in kanban['boards'].keys():
-        val = kanban['boards'][id]
-        if not is_string_or_unicode(val):
-            kanban['boards'][id] = val
-    # tasks
-    for id in kanban['tasks'].keys():
-        val = kanban['tasks'][id]
-        DEFAULT_TASK = {
-                'name' : is_string_or_unicode,
-                'board': is_string_or_unicode,
-                'remind_on' : is_string_or_unicode,
-                'remind_for' : is_numeric
-            }
-        kanban['tasks'][id] = validate_dictionary(val, validator, DEFAULT_TASK)
+    kanban = KanbanStore.from_dictionary(load_json_file(file_name, validator, DEFAULT_KANBAN))
+    save_kanban_snapshot(file_name, signature, kanban)
     return kanban
 
 def save_configuration(configuration):
-    save_json_file(CONFIGURATION_FILE, configuration)
+    if BATCH is not None: # saved when the batch is done
+        BATCH.configuration = copy_configuration(configuration)
+        return
+    store_cached_json_file(CONFIGURATION_FILE, configuration, copy_configuration)
 
-def save_kanban(kanban):
-    save_json_file(KANBAN_FILE, kanban)
+def save_kanban(kanban, file_name=None):
+    file_name = KANBAN_FILE if file_name is None else file_name
+    offsets = save_file(file_name, lambda outfile: write_kanban_file(outfile, kanban))
+    update_json_file_cache(file_name, kanban, copy_kanban)
+    signature = get_file_signature(file_name)
+    save_kanban_snapshot(file_name, signature, kanban)
+    save_kanban_offsets(file_name, signature, offsets)
 
-def beep(file_name):
+class CommandSoundBackend(object):
+    '''
+    Play sound by running configured sound_player command, wait until it is finished so that no zombie is left
+    '''
+
+    def __init__(self, sound_player):
+        self.sound_player = sound_player
+        # default sound_player use bash's "&>" redirection
+        self.shell = '/bin/bash' if os.path.exists('/bin/bash') else None
+
+    def play(self, file_name):
+        with open(os.devnull, 'w') as devnull:
+            subprocess.call(self.sound_player %(file_name,), shell=True, executable=self.shell, stdout=devnull, stderr=devnull)
+
+class PygameSoundBackend(object):
+    '''
+    Decode every sound file once and keep it in memory, playing is done by pygame's mixer
+    '''
+
+    def __init__(self):
+        import pygame.mixer # optional dependency
+        pygame.mixer.init()
+        self.mixer = pygame.mixer
+        self.sounds = {}
+
+    def play(self, file_name):
+        if file_name not in self.sounds:
+            self.sounds[file_name] = self.mixer.Sound(file_name)
+        self.sounds[file_name].play()
+
+def create_sound_backend(sound_backend, sound_player):
+    if sound_backend in ('auto', 'pygame'):
+        try:
+            return PygameSoundBackend()
+        except Exception: # pygame is not installed or there is no audio device
+            pass
+    return CommandSoundBackend(sound_player)
+
+class AudioPlayer(object):
+    '''
+    Long-lived worker thread playing queued sounds. Queueing never blocks, the same sound that is still waiting
+    to be played is coalesced, and the oldest sounds are dropped if the player falls behind
+    '''
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def play(self, file_name):
+        with self.condition:
+            if file_name in self.queue:
+                return
+            if len(self.queue) >= AUDIO_QUEUE_SIZE:
+                self.queue.popleft()
+            self.queue.append(file_name)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while len(self.queue) == 0:
+                    self.condition.wait()
+                file_name = self.queue.popleft()
+            try:
+                self.backend.play(file_name)
+            except Exception: # a broken sound file should not kill the player
+                pass
+
+AUDIO_PLAYER = None
+AUDIO_PLAYER_KEY = None
+
+def get_audio_player():
+    global AUDIO_PLAYER, AUDIO_PLAYER_KEY
     configuration = load_configuration()
-    sound_player = configuration['sound_player']
-    os.system(sound_player %(file_name,))
+    key = (configuration['sound_backend'], configuration['sound_player'])
+    if AUDIO_PLAYER is None:
+        AUDIO_PLAYER = AudioPlayer(create_sound_backend(*key))
+    elif key != AUDIO_PLAYER_KEY:
+        AUDIO_PLAYER.backend = create_sound_backend(*key)
+    AUDIO_PLAYER_KEY = key
+    return AUDIO_PLAYER
+
+def beep(file_name):
+    get_audio_player().play(file_name)
 
 def tick_beep():
     configuration = load_configuration()
@@ -171,66 +1365,387 @@ def switch_beep():
     file_name = configuration['switch_sound_file']
     beep(file_name)
 
-def parse_str_timestamp_keyword(string, keyword, localtime):
-    keyword = keyword.lower()
-    string = string.lower()
-    (year, mon, mday, hour, minute, sec, wday, yday, dst) = localtime
-    year = str(year).rjust(4,'0')
-    mon = str(mon).rjust(2,'0')
-    mday = str(mday).rjust(2,'0')
-    if string[:len(keyword)] == keyword:
-        string = string.replace(keyword, '%s-%s-%s' % (year, mon, mday))
-    return string
-
-def complete_str_timestamp(string):
-    localtime = time.localtime()
-    (year, mon, mday, hour, minute, sec, wday, yday, dst) = localtime
-    year = str(year).rjust(4,'0')
-    mon = str(mon).rjust(2,'0')
-    mday = str(mday).rjust(2,'0')
-    # everyday, daily
-    string = parse_str_timestamp_keyword(string, 'everyday', localtime)
-    string = parse_str_timestamp_keyword(string, 'daily', localtime)
-    # weekly (eg: every thursday, thursday, thu)
-    aliases = DAYS[wday]
-    for alias in aliases:
-        for prefix in ('', 'every '):
-            string = parse_str_timestamp_keyword(string, prefix + alias, localtime)
-    # monthly (eg: every 1st, 1st, 1)
-    alias = str(mday)
-    for suffix in DATE_SUFFIX:
-        break
-        string = parse_str_timestamp_keyword(string, alias+suffix, localtime)
-    # stars
-    aliases = ('*-*-*',
-            '*-*-%s' % (mday),
-            '*-%s-*' % (mon),
-            '*-%s-%s' % (mon, mday),
-            '%s-*-%s' % (year, mday),
-            '%s-%s-*' % (year, mon),
-            '%s-%s-%s' % (year, mon, mday)
-            )
-    for alias in aliases:
-        string = parse_str_timestamp_keyword(string, alias, localtime)
-    # ensure that string is valid date, otherwise make it empty string
-    try:
-        datetime.datetime.strptime(string, '%Y-%m-%d %H:%M:%S')
-        return string
+class TerminalNotificationSink(object):
+    name = 'terminal'
+
+    def send(self, message):
+        sys.stdout.write('\r * %s\n' %(message,))
+        sys.stdout.flush()
+
+class SoundNotificationSink(object):
+    '''
+    Play file_name by player. Both are given by the main thread, send (run by the workers of NotificationDispatcher)
+    only queues the file, so that the workers don't touch the configuration or create the audio player
+    '''
+    name = 'sound'
+
+    def __init__(self, file_name, player):
+        self.file_name = file_name
+        self.player = player
+
+    def send(self, message):
+        self.player.play(self.file_name)
+
+class CommandNotificationSink(object):
+    '''
+    Run command with the message (quoted for shell) in place of %s, e.g: tmux display-message or notify-send.
+    The command is killed if it is still running after timeout seconds
+    '''
+
+    def __init__(self, name, command, timeout=NOTIFICATION_TIMEOUT):
+        self.name = name
+        self.command = command
+        self.timeout = timeout
+        self.shell = '/bin/bash' if os.path.exists('/bin/bash') else None
+
+    def send(self, message):
+        message = message.encode('utf-8') if type(message) == unicode else message
+        command = self.command.replace('%s', shell_quote(message)) if '%s' in self.command else self.command + ' ' + shell_quote(message)
+        with open(os.devnull, 'w') as devnull:
+            process = subprocess.Popen(command, shell=True, executable=self.shell, stdout=devnull, stderr=devnull)
+            deadline = monotonic_time() + self.timeout
+            while process.poll() is None:
+                if monotonic_time() >= deadline:
+                    process.kill()
+                    process.wait()
+                    return
+                time.sleep(0.05)
+
+def create_notification_sinks(configuration):
+    sinks = []
+    for name in str(configuration['notification_sinks']).split(','):
+        name = name.strip()
+        if name == 'terminal':
+            sinks.append(TerminalNotificationSink())
+        elif name == 'sound':
+            sinks.append(SoundNotificationSink(configuration['alarm_sound_file'], get_audio_player()))
+        elif name == 'tmux' and 'TMUX' in os.environ:
+            sinks.append(CommandNotificationSink('tmux', 'tmux display-message %s'))
+        elif name == 'desktop':
+            sinks.append(CommandNotificationSink('desktop', configuration['notify_command']))
+    return sinks
+
+class NotificationDispatcher(object):
+    '''
+    Deliver notifications to every sink on a bounded pool of worker threads, so that slow (or hung) sinks never delay the caller.
+    A notification is dropped if one with the same key is still pending or has been sent in the last rate_limit seconds,
+    and deliveries are dropped if the queue is full
+    '''
+
+    def __init__(self, sinks, worker_count=NOTIFICATION_WORKER_COUNT, queue_size=NOTIFICATION_QUEUE_SIZE, rate_limit=NOTIFICATION_RATE_LIMIT):
+        self.sinks = sinks
+        self.rate_limit = rate_limit
+        self.disabled = set() # name of sinks that are turned off
+        self.pending = {} # key : number of deliveries that are not done yet
+        self.sent_times = {} # key : (monotonic) time of the last notification
+        self.lock = threading.Lock()
+        self.queue = Queue(queue_size)
+        self.workers = []
+        for i in range(worker_count):
+            worker = threading.Thread(target=self.run)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def notify(self, key, message, current_time=None):
+        '''
+        Queue message for every enabled sink without blocking, return False if it is dropped as duplicate
+        '''
+        current_time = monotonic_time() if current_time is None else current_time
+        with self.lock:
+            sinks = [sink for sink in self.sinks if sink.name not in self.disabled]
+            if len(sinks) == 0 or key in self.pending or current_time - self.sent_times.get(key, float('-inf')) < self.rate_limit:
+                return False
+            self.sent_times[key] = current_time
+            self.pending[key] = len(sinks)
+        for sink in sinks:
+            try:
+                self.queue.put_nowait((key, sink, message))
+            except QueueFull:
+                self.done(key)
+        return True
+
+    def done(self, key):
+        with self.lock:
+            self.pending[key] -= 1
+            if self.pending[key] <= 0:
+                self.pending.pop(key, None)
+
+    def close(self, timeout=1):
+        '''
+        Let the workers finish the queued deliveries, but don't wait for them longer than timeout seconds
+        '''
+        for worker in self.workers:
+            try:
+                self.queue.put_nowait(None)
+            except QueueFull:
+                pass
+        deadline = monotonic_time() + timeout
+        for worker in self.workers:
+            worker.join(max(deadline - monotonic_time(), 0))
+
+    def run(self):
+        while True:
+            delivery = self.queue.get()
+            if delivery is None: # closed
+                return
+            (key, sink, message) = delivery
+            try:
+                sink.send(message)
+            except Exception: # a broken sink should not kill the worker
+                pass
+            finally:
+                self.done(key)
+
+DAY_START_CACHE = {} # date : (timestamp of 00:00, seconds until the next 00:00)
+
+def get_day_start(date):
+    if date not in DAY_START_CACHE:
+        day_start = time.mktime((date.year, date.month, date.day, 0, 0, 0, 0, 0, -1))
+        next_date = date + datetime.timedelta(1)
+        next_day_start = time.mktime((next_date.year, next_date.month, next_date.day, 0, 0, 0, 0, 0, -1))
+        DAY_START_CACHE[date] = (day_start, next_day_start - day_start)
+    return DAY_START_CACHE[date]
+
+class ReminderRule(object):
+    '''
+    Compiled remind_on. kind is one of:
+    * once   : year, month, day are all set (e.g: 2016-05-26 17:00)
+    * daily  : every day (e.g: everyday 17:00, daily 17:00, 17:00)
+    * weekly : every weekday (e.g: tuesday 17:00, every tue 17:00)
+    * date   : star pattern/monthly, None means any (e.g: *-*-26 17:00, every 26th 17:00)
+    '''
+    __slots__ = ('kind', 'year', 'month', 'day', 'weekday', 'hour', 'minute', 'second')
+
+    def __init__(self, kind, hour, minute, second, year=None, month=None, day=None, weekday=None):
+        self.kind = kind
+        (self.year, self.month, self.day, self.weekday) = (year, month, day, weekday)
+        (self.hour, self.minute, self.second) = (hour, minute, second)
+
+    def matches(self, date):
+        if self.kind == 'daily':
+            return True
+        if self.kind == 'weekly':
+            return date.weekday() == self.weekday
+        return (self.year is None or self.year == date.year) and \
+                (self.month is None or self.month == date.month) and \
+                (self.day is None or self.day == date.day)
+
+    def get_time_start(self, date):
+        '''
+        Return timestamp of the occurrence on date, or None if the rule doesn't match the date
+        '''
+        if not self.matches(date):
+            return None
+        (day_start, day_length) = get_day_start(date)
+        if day_length == 86400: # no daylight saving switch, no need to ask mktime
+            return day_start + self.hour * 3600 + self.minute * 60 + self.second
+        return time.mktime((date.year, date.month, date.day, self.hour, self.minute, self.second, 0, 0, -1))
+
+    def iter_dates(self, first_date):
+        '''
+        Yield every date matching the rule starting from first_date
+        '''
+        if self.kind == 'daily' or self.kind == 'weekly':
+            step = 1 if self.kind == 'daily' else 7
+            date = first_date if self.kind == 'daily' else first_date + datetime.timedelta((self.weekday - first_date.weekday()) % 7)
+            while True:
+                yield date
+                date += datetime.timedelta(step)
+        years = [self.year] if self.year is not None else range(first_date.year, first_date.year + REMINDER_LOOKAHEAD_YEARS)
+        months = [self.month] if self.month is not None else range(1, 13)
+        days = [self.day] if self.day is not None else range(1, 32)
+        for year in years:
+            if year < first_date.year:
+                continue
+            for month in months:
+                if (year, month) < (first_date.year, first_date.month):
+                    continue
+                for day in days:
+                    try:
+                        date = datetime.date(year, month, day)
+                    except ValueError: # e.g: February 30th
+                        continue
+                    if date >= first_date:
+                        yield date
+
+    def iter_occurrences(self, time_from, time_to, remind_for):
+        '''
+        Yield (time_start, time_stop) of every occurrence that is still active at time_from and starts before time_to
+        '''
+        first_date = datetime.date.fromtimestamp(time_from - remind_for)
+        for date in self.iter_dates(first_date):
+            time_start = self.get_time_start(date)
+            if time_start >= time_to:
+                return
+            if time_start + remind_for > time_from:
+                yield (time_start, time_start + remind_for)
+
+    def get_next_occurrence(self, current_time, remind_for):
+        '''
+        Return (time_start, time_stop) of the first occurrence that is not over yet at current_time, or None
+        '''
+        for occurrence in self.iter_occurrences(current_time, float('inf'), remind_for):
+            return occurrence
+        return None
+
+REMINDER_RULE_CACHE = {}
+REMINDER_TIME_PATTERN = re.compile(r'^([0-9]{1,2}):([0-9]{2})(?::([0-9]{2}))?$')
+REMINDER_MONTHLY_PATTERN = re.compile(r'^(?:every )?([0-9]{1,2})(?:%s)$' % ('|'.join(DATE_SUFFIX),))
+REMINDER_DATE_PATTERN = re.compile(r'^([0-9]{4}|\*)-([0-9]{1,2}|\*)-([0-9]{1,2}|\*)$')
+
+def parse_remind_on(string):
+    string = ' '.join(string.lower().split())
+    if string == '':
+        return None
+    # time part (the last word)
+    (date_part, _, time_part) = string.rpartition(' ')
+    match = REMINDER_TIME_PATTERN.match(time_part)
+    if match is None:
+        return None
+    (hour, minute, second) = (int(match.group(1)), int(match.group(2)), int(match.group(3) or 0))
+    if hour > 23 or minute > 59 or second > 59:
+        return None
+    # everyday, daily (e.g: everyday 17:00, 17:00)
+    if date_part in ('', 'everyday', 'every day', 'daily'):
+        return ReminderRule('daily', hour, minute, second)
+    # weekly (e.g: every thursday, thursday, thu)
+    for weekday, aliases in enumerate(DAYS):
+        for alias in aliases:
+            if date_part == alias or date_part == 'every ' + alias:
+                return ReminderRule('weekly', hour, minute, second, weekday=weekday)
+    # monthly (e.g: every 1st, 1st)
+    match = REMINDER_MONTHLY_PATTERN.match(date_part)
+    if match is not None:
+        day = int(match.group(1))
+        return ReminderRule('date', hour, minute, second, day=day) if 1 <= day <= 31 else None
+    # stars and exact date (e.g: *-*-26, *-05-*, 2016-05-26)
+    match = REMINDER_DATE_PATTERN.match(date_part)
+    if match is None:
+        return None
+    (year, month, day) = [None if x == '*' else int(x) for x in match.groups()]
+    if (month is not None and not 1 <= month <= 12) or (day is not None and not 1 <= day <= 31):
+        return None
+    if year is None or month is None or day is None:
+        return ReminderRule('date', hour, minute, second, year=year, month=month, day=day)
+    try:
+        datetime.date(year, month, day)
     except ValueError:
-        try:
-            datetime.datetime.strptime(string, '%Y-%m-%d %H:%M')
-            return string+':00'
-        except ValueError:
-            return ''
+        return None
+    return ReminderRule('once', hour, minute, second, year=year, month=month, day=day)
+
+def compile_remind_on(string):
+    '''
+    Return ReminderRule of remind_on string or None if it is empty/invalid. Memoized per remind_on
+    '''
+    if string not in REMINDER_RULE_CACHE:
+        REMINDER_RULE_CACHE[string] = parse_remind_on(string)
+    return REMINDER_RULE_CACHE[string]
+
+def complete_str_timestamp(string, localtime=None):
+    timestamp = str_to_timestamp(string, localtime)
+    return timestamp_to_str(timestamp) if timestamp is not None else ''
 
-def str_to_timestamp(string):
-    string = complete_str_timestamp(string)
-    if string != '':
-        return time.mktime(datetime.datetime.strptime(string, '%Y-%m-%d %H:%M:%S').timetuple())
+def str_to_timestamp(string, localtime=None):
+    rule = compile_remind_on(string)
+    if rule is None:
+        return None
+    if rule.kind == 'once':
+        return rule.get_time_start(datetime.date(rule.year, rule.month, rule.day))
+    localtime = time.localtime() if localtime is None else localtime
+    return rule.get_time_start(datetime.date(localtime[0], localtime[1], localtime[2]))
 
 def timestamp_to_str(timestamp):
     return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
 
+MONOTONIC_CLOCK = None
+
+def get_monotonic_clock():
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    try:
+        import ctypes, ctypes.util
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+        clock_gettime = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True).clock_gettime
+        value = timespec()
+        def monotonic():
+            clock_gettime(1, ctypes.byref(value)) # CLOCK_MONOTONIC
+            return value.tv_sec + value.tv_nsec * 1e-9
+        monotonic()
+        return monotonic
+    except (OSError, AttributeError):
+        return time.time
+
+def monotonic_time():
+    global MONOTONIC_CLOCK
+    if MONOTONIC_CLOCK is None:
+        MONOTONIC_CLOCK = get_monotonic_clock()
+    return MONOTONIC_CLOCK()
+
+class PomodoroTimer(object):
+    '''
+    Work/rest countdown based on a monotonic deadline, so it doesn't drift no matter how long each loop iteration takes
+    '''
+
+    def __init__(self, work_time, rest_time, state='work', current_time=None):
+        current_time = monotonic_time() if current_time is None else current_time
+        self.durations = {'work' : max(float(work_time), 1), 'rest' : max(float(rest_time), 1)}
+        self.state = state
+        self.paused = False
+        self.remaining = self.durations[state] # only used while paused
+        self.deadline = current_time + self.remaining
+
+    def get_remaining(self, current_time):
+        return self.remaining if self.paused else self.deadline - current_time
+
+    def get_counter(self, current_time):
+        return max(int(math.ceil(self.get_remaining(current_time))), 0)
+
+    def get_next_boundary(self, current_time):
+        '''
+        Return (monotonic) time of the next second boundary of the countdown
+        '''
+        if self.paused:
+            return current_time + 1
+        remaining = self.deadline - current_time
+        fraction = remaining - math.floor(remaining)
+        return current_time + (fraction if fraction > 0 else 1)
+
+    def toggle_pause(self, current_time):
+        if self.paused:
+            self.deadline = current_time + self.remaining
+        else:
+            self.remaining = self.deadline - current_time
+        self.paused = not self.paused
+
+    def switch_state(self, current_time):
+        self.state = 'work' if self.state == 'rest' else 'rest'
+        self.remaining = self.durations[self.state]
+        self.deadline = current_time + self.remaining
+
+    def update(self, current_time):
+        '''
+        Switch state for every deadline that has been passed, return how many times the state has been switched
+        '''
+        switch_count = 0
+        while not self.paused and self.deadline <= current_time:
+            # next deadline is counted from the previous one, not from current_time
+            self.switch_state(self.deadline)
+            switch_count += 1
+        return switch_count
+
+def wait_for_input(fds, timeout):
+    '''
+    Block until one of fds is readable or timeout (in seconds) passed, return list of readable fds
+    '''
+    try:
+        return select.select(fds, [], [], max(timeout, 0))[0]
+    except select.error as e: # interrupted by signal
+        if e.args[0] != errno.EINTR:
+            raise
+        return []
+
 def get_formatted_counter(counter):
     counter = int(counter)
     (hour, minute) = divmod(counter, 3600)
@@ -244,16 +1759,23 @@ def get_formatted_counter(counter):
 @example: str_as_dictionary('name:my task, board:to do, alarm:tuesday')
 '''
 def str_as_dictionary(string):
-    string = string.replace('"', '\\"') # escape all double quotes
-    pattern = re.compile(r'\s*,\s*([a-z0-9_\-]*?)\s*:\s*')
-    string = pattern.sub(r'","\1":"', "," +string)
-    string = string[3:] # remove unnecessary '"",'
-    string = '"' + string + '"' if string != '' else string # suround with double quote if necessary
-    string = '{' + string + '}' # make it a valid json
-    try:
-        dictionary = json.loads(string) # turn json into dictionary
-    except(ValueError):
-        dictionary = {}
+    '''
+    Single pass over the arguments. A key starts after a comma, so a value can contain colons and commas not followed by "key:"
+    '''
+    if type(string) == str:
+        string = string.decode('utf-8', 'replace')
+    dictionary = {}
+    (key, start) = (None, 0)
+    for match in ARGUMENT_KEY_PATTERN.finditer(string):
+        if key is None and match.group(1) != '': # arguments should start with a key
+            return {}
+        if key is not None:
+            dictionary[key] = string[start:match.start()]
+        (key, start) = (match.group(2), match.end())
+    if key is not None:
+        dictionary[key] = string[start:]
+    elif string != '':
+        return {}
     for key in dictionary.keys(): # fix the type
         val = dictionary[key]
         if val.lower() == 'true':
@@ -266,314 +1788,2368 @@ def str_as_dictionary(string):
             dictionary[key] = float(val)
     return dictionary # done, return the dictionary
 
-def print_table(array):
+def iter_table_lines(columns, col_width=None, size=None, row_start=0, row_stop=None):
+    '''
+    Yield lines of a table drawn from columns (sequences of cells, the first cell is the caption), cut to terminal width (size).
+    Only the rows from row_start to row_stop (not counting the caption, which is always drawn) are formatted,
+    and only the cells fitting the width are taken from the columns, so a column can create it's cells lazily
+    '''
     # get col_width
-    col_width = []
-    for row in array:
-        for i, cell in enumerate(row):
-            if len(col_width) <= i:
-                col_width.append(0)
-            if len(cell) > col_width[i]:
-                col_width[i] = len(cell)
-    # get total width
-    total_width = 0
-    for width in col_width:
-        total_width += width
-    # print output
-    size = get_terminal_col_size()
-    output = ''.ljust(total_width+(3*(len(row)-1)), '=')
-    output = output[:size]
-    print output
-    for row_index,row in enumerate(array):
-        output_row = []
-        for i,cell in enumerate(row):
-            width = col_width[i]
-            output_row.append(cell.ljust(width, ' '))
-        output_row = ' | '.join(output_row)
-        output_row = output_row[:size]
-        print(output_row)
-        separator = '-' if row_index>0 else '='
-        output_row = ''.ljust(total_width+(3*(len(row)-1)) , separator)
-        output_row = output_row[:size]
-        print(output_row)
+    if col_width is None:
+        col_width = [max([len(cell) for cell in cells] + [0]) for cells in columns]
+    total_width = sum(col_width) + 3 * (len(col_width) - 1)
+    size = get_terminal_col_size() if size is None else size
+    separators = {'=' : ''.ljust(total_width, '=')[:size], '-' : ''.ljust(total_width, '-')[:size]}
+    row_count = max([len(cells) for cells in columns] + [1])
+    row_stop = row_count - 1 if row_stop is None else min(row_stop, row_count - 1)
+    def format_row(row_index):
+        (output_row, position) = ([], 0)
+        for (cells, width) in zip(columns, col_width):
+            if position >= size:
+                output_row.append('') # the separator before it might be partly visible
+                break
+            cell = cells[row_index] if row_index < len(cells) else ''
+            output_row.append(cell[:size - position].ljust(min(width, size - position), ' '))
+            position += width + 3
+        return ' | '.join(output_row)[:size]
+    yield separators['=']
+    yield format_row(0)
+    yield separators['=']
+    for row_index in range(max(row_start, 0) + 1, row_stop + 1):
+        yield format_row(row_index)
+        yield separators['-']
+
+def get_table_lines(columns, col_width=None, size=None, max_lines=None):
+    '''
+    Return lines of columns drawn as table (see iter_table_lines), cut to terminal width (size) and max_lines
+    '''
+    row_stop = None if max_lines is None else max_lines // 2
+    return list(itertools.islice(iter_table_lines(columns, col_width, size, 0, row_stop), max_lines))
+
+def write_lines(lines, outfile=None):
+    '''
+    Write lines as they come, TABLE_BUFFER_SIZE lines at once
+    '''
+    outfile = sys.stdout if outfile is None else outfile
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= TABLE_BUFFER_SIZE:
+            outfile.write('\n'.join(buffer) + '\n')
+            buffer = []
+    if len(buffer) > 0:
+        outfile.write('\n'.join(buffer) + '\n')
+
+def print_table(columns, col_width=None, row_start=0, row_stop=None):
+    write_lines(iter_table_lines(columns, col_width, None, row_start, row_stop))
+
+def is_valid_remind_on(remind_on):
+    return is_string_or_unicode(remind_on) and (remind_on.strip() == '' or compile_remind_on(remind_on) is not None)
+
+def get_next_reminder_time(remind_on, remind_for, current_time):
+    '''
+    Get (time_start, time_stop) of the first occurrence of remind_on that is not over yet at current_time.
+    Return None if there is no such occurrence (empty/invalid remind_on, or one time reminder that already passed)
+    '''
+    rule = compile_remind_on(remind_on)
+    if rule is None:
+        return None
+    return rule.get_next_occurrence(current_time, float(remind_for))
+
+class ReminderSchedule(object):
+    '''
+    Keep fire and expire time of every task's reminder in a heap ordered by the next event,
+    so that each tick only has to look at the head of the heap
+    '''
+
+    def __init__(self):
+        self.heap = [] # (event_time, sequence, task_id)
+        self.entries = {} # task_id : {'task', 'key', 'time_start', 'time_stop', 'sequence'}
+        self.active_tasks = {} # task_id : task
+        self.sequence = 0
+
+    def update(self, tasks, current_time=None):
+        '''
+        Synchronize the schedule with tasks, only entries of changed tasks are rebuilt
+        '''
+        current_time = time.time() if current_time is None else current_time
+        for task_id in [x for x in self.entries if x not in tasks]:
+            self.remove(task_id)
+        for task_id in tasks:
+            task = tasks[task_id]
+            key = (task.remind_on, task.remind_for)
+            entry = self.entries.get(task_id)
+            if entry is not None and entry['key'] == key:
+                # reminder doesn't change, but name or board might
+                entry['task'] = task
+                if task_id in self.active_tasks:
+                    self.active_tasks[task_id] = task
+                continue
+            self.remove(task_id)
+            self.entries[task_id] = {'task' : task, 'key' : key, 'time_start' : None, 'time_stop' : None, 'sequence' : None}
+            self.schedule(task_id, current_time)
+
+    def remove(self, task_id):
+        # heap item of removed entry is discarded once it reach the head
+        self.entries.pop(task_id, None)
+        self.active_tasks.pop(task_id, None)
+
+    def schedule(self, task_id, current_time):
+        entry = self.entries[task_id]
+        task = entry['task']
+        reminder_time = get_next_reminder_time(task.remind_on, task.remind_for, current_time)
+        if reminder_time is None:
+            entry['time_start'], entry['time_stop'], entry['sequence'] = None, None, None
+            return
+        entry['time_start'], entry['time_stop'] = reminder_time
+        self.push(task_id, entry['time_start'])
+
+    def push(self, task_id, event_time):
+        self.sequence += 1
+        self.entries[task_id]['sequence'] = self.sequence
+        heapq.heappush(self.heap, (event_time, self.sequence, task_id))
+
+    def get_next_event_time(self):
+        '''
+        Return time of the next fire/expire event, or None if nothing is scheduled
+        '''
+        while len(self.heap) > 0:
+            (event_time, sequence, task_id) = self.heap[0]
+            entry = self.entries.get(task_id)
+            if entry is not None and entry['sequence'] == sequence:
+                return event_time
+            heapq.heappop(self.heap) # stale
+        return None
+
+    def tick(self, current_time=None):
+        '''
+        Process every due event, return True if active tasks has been changed
+        '''
+        current_time = time.time() if current_time is None else current_time
+        changed = False
+        while True:
+            event_time = self.get_next_event_time()
+            if event_time is None or event_time > current_time:
+                break
+            (event_time, sequence, task_id) = heapq.heappop(self.heap)
+            entry = self.entries[task_id]
+            if task_id not in self.active_tasks and current_time < entry['time_stop']: # fire
+                self.active_tasks[task_id] = entry['task']
+                self.push(task_id, entry['time_stop'])
+                changed = True
+            else: # expire, roll forward to the next occurrence
+                if self.active_tasks.pop(task_id, None) is not None:
+                    changed = True
+                self.schedule(task_id, max(current_time, entry['time_stop']))
+        return changed
+
+REMINDER_SCHEDULES = {} # file_name : (signature, ReminderSchedule)
+
+class JsonKanbanStorage(object):
+    '''
+    Kanban stored in a JSON file (kanban.json). Changes are kept in memory until commit().
+    Until the whole kanban is needed, boards and single tasks are read by their offsets, and task changes are patched into the file
+    '''
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.kanban = None
+        self.signature = None # signature of the file self.kanban was read from
+        self.changes = [] # (method name, arguments...) since the last commit, applied again on conflict
+        self.pending_tasks = {} # id : dictionary or None (deleted), tasks changed while the kanban is not loaded
+        self.next_ids = {} # 'add_board'/'add_task' : smallest id that might be free
+        self.dirty = False
+        self.commit_deferred = False # set while batch is running, it commits once every command is done
+
+    def get_kanban(self):
+        if self.kanban is None:
+            self.signature = self.get_signature()
+            self.kanban = load_kanban(self.file_name)
+            # task changes made before the kanban was loaded, new ids are given again from the loaded tasks
+            self.next_ids = {}
+            for change in self.changes:
+                self.apply(change)
+            self.pending_tasks = {}
+        return self.kanban
+
+    def is_loaded(self):
+        '''
+        Return True if the whole kanban is in memory already (here or in JSON_FILE_CACHE)
+        '''
+        return self.kanban is not None or os.path.abspath(os.path.expanduser(self.file_name)) in JSON_FILE_CACHE
+
+    def get_signature(self):
+        return get_file_signature(self.file_name)
+
+    def get_file_names(self):
+        return [self.file_name]
+
+    def reload(self):
+        self.kanban = None
+        self.changes = []
+        self.pending_tasks = {}
+        self.next_ids = {}
+        self.dirty = False
+
+    def rollback(self):
+        self.reload()
+
+    def commit(self):
+        '''
+        Save the changes. If kanban.json has been changed by another process since it was read,
+        it is read again and the changes are applied on top of it (task by task) before saving, all while holding the lock
+        '''
+        if not self.dirty or self.commit_deferred:
+            return
+        with FileLock(self.file_name):
+            if self.kanban is not None or not patch_kanban_file(self.file_name, self.changes):
+                if self.kanban is None:
+                    self.get_kanban()
+                elif self.get_signature() != self.signature:
+                    self.merge()
+                save_kanban(self.kanban, self.file_name)
+            self.signature = self.get_signature()
+        self.changes = []
+        self.pending_tasks = {}
+        self.dirty = False
+
+    def merge(self):
+        (self.kanban, changes, self.changes) = (None, self.changes, [])
+        self.next_ids = {}
+        for change in changes:
+            if self.apply(change) in (None, False):
+                (method, id) = change[:2]
+                kind = 'Board' if method.endswith('board') else 'Task'
+                if method.startswith('add'):
+                    print('%s with id %s already exists' %(kind, id))
+                else:
+                    print('%s with id %s doesn\'t exists' %(kind, id))
+
+    def generate_id(self, kind, dictionary):
+        if kind not in self.next_ids:
+            self.next_ids[kind] = generate_dictionary_id(dictionary)
+        while str(self.next_ids[kind]) in dictionary:
+            self.next_ids[kind] += 1
+        return str(self.next_ids[kind])
+
+    def change(self, *change):
+        '''
+        Apply change to the kanban and remember it for commit. Return the result of the change (None or False if failed)
+        '''
+        if self.is_loaded() or change[0] not in ('add_task', 'edit_task', 'delete_task'):
+            result = self.apply(change)
+        else:
+            result = self.stage(change)
+        if result not in (None, False):
+            self.changes.append(change)
+            self.dirty = True
+        return result
+
+    def stage(self, change):
+        '''
+        Check task change without loading the kanban and keep the changed task in pending_tasks, it is patched into the file by commit()
+        '''
+        (method, id, value) = (change + (None,))[:3]
+        if method == 'add_task' and id is None:
+            if 'add_task' not in self.next_ids:
+                max_id = get_kanban_max_task_id(self.file_name)
+                if max_id is None: # ids are not known without loading the kanban
+                    return self.apply(change)
+                self.next_ids['add_task'] = max_id + 1
+            while self.get_task(str(self.next_ids['add_task'])) is not None:
+                self.next_ids['add_task'] += 1
+            # commit() gives the id again while holding the lock, so a task added by another process meanwhile doesn't matter
+            id = str(self.next_ids['add_task'])
+            task = None
+        else:
+            task = self.get_task(id)
+        if method == 'add_task':
+            if task is not None:
+                return None
+            self.pending_tasks[id] = Task.from_dictionary(id, value).as_dictionary()
+            return id
+        if task is None:
+            return False
+        if method == 'edit_task':
+            task.update(value)
+            self.pending_tasks[id] = Task.from_dictionary(id, task).as_dictionary()
+        else:
+            self.pending_tasks[id] = None
+        return True
+
+    def apply(self, change):
+        kanban = self.get_kanban()
+        kanban.index = None
+        (method, id, value) = (change + (None,))[:3]
+        if method == 'add_board' or method == 'add_task':
+            dictionary = kanban.boards if method == 'add_board' else kanban.tasks
+            id = id if id is not None else self.generate_id(method, dictionary)
+            if id in dictionary:
+                return None
+            if method == 'add_board':
+                kanban.boards[id] = value
+            else:
+                kanban.set_task(id, value)
+            return id
+        if method == 'edit_board':
+            if id not in kanban.boards:
+                return False
+            kanban.boards[id] = value
+        elif method == 'edit_task':
+            if id not in kanban.tasks:
+                return False
+            task = kanban.tasks[id].as_dictionary()
+            task.update(value)
+            kanban.set_task(id, task)
+        elif method == 'delete_board':
+            if kanban.boards.pop(id, None) is None:
+                return False
+        elif method == 'delete_task':
+            if kanban.tasks.pop(id, None) is None:
+                return False
+        return True
+
+    def get_boards(self):
+        if not self.is_loaded():
+            return read_kanban_boards(self.file_name)
+        return dict(self.get_kanban().boards)
+
+    def get_board_id(self, board):
+        if not self.is_loaded():
+            return find_board_id(self.get_boards(), board)
+        index = self.get_kanban().get_index()
+        board_id_map = index.get_board_id_map()
+        board = str(board)
+        if board in index.boards: # by id
+            return board
+        elif board.lower().replace(' ', '') in board_id_map: # by caption
+            return board_id_map[board.lower().replace(' ', '')]
+        # by default return the first key
+        for board in sorted(index.boards, key = lambda key: int(key)):
+            return board
+        return ''
+
+    def add_board(self, name, id=None):
+        return self.change('add_board', str(id) if id is not None else None, name)
+
+    def edit_board(self, id, name):
+        return self.change('edit_board', id, name)
+
+    def delete_board(self, id):
+        return self.change('delete_board', id)
+
+    def get_task(self, id):
+        '''
+        Return copy of the task as dictionary (so that it can be modified and passed to edit_task), or None
+        '''
+        if id in self.pending_tasks:
+            task = self.pending_tasks[id]
+            return dict(task) if task is not None else None
+        if not self.is_loaded():
+            task = read_kanban_task(self.file_name, id)
+        else:
+            task = self.get_kanban().tasks.get(id)
+        return task.as_dictionary() if task is not None else None
+
+    def get_task_map(self):
+        '''
+        Return {id : Task} of every task, it should not be modified
+        '''
+        return self.get_kanban().tasks
+
+    def get_tasks(self, board=None):
+        '''
+        Return list of (id, Task) ordered by id, optionally only tasks of a board
+        '''
+        tasks = self.get_kanban().tasks
+        ids = tasks.keys() if board is None else [x for x in tasks if tasks[x].board == board]
+        return [(id, tasks[id]) for id in sorted(ids, key = lambda key: int(key))]
+
+    def iter_tasks(self, board=None):
+        '''
+        Like get_tasks, but a kanban that is not loaded yet is read task by task (in file order) instead
+        '''
+        if not self.is_loaded() and len(self.changes) == 0:
+            for (id, task) in iter_kanban_tasks(self.file_name):
+                if board is None or task.board == board:
+                    yield (id, task)
+            return
+        tasks = self.get_kanban().tasks
+        ids = tasks.keys() if board is None else [x for x in tasks if tasks[x].board == board]
+        for id in sorted(ids, key = lambda key: int(key)):
+            yield (id, tasks[id])
+
+    def query_tasks(self, **filters):
+        '''
+        Return list of (id, Task) ordered by id, matching filters (see KanbanIndex.query)
+        '''
+        kanban = self.get_kanban()
+        return [(id, kanban.tasks[id]) for id in kanban.get_index().query(**filters)]
+
+    def add_task(self, task, id=None):
+        return self.change('add_task', str(id) if id is not None else None, dict(task))
+
+    def edit_task(self, id, task):
+        # only the modified keys are kept, so that concurrent changes of other keys are not overwritten
+        original = self.get_task(id)
+        if original is None:
+            return False
+        return self.change('edit_task', id, {key : task[key] for key in task if key not in original or original[key] != task[key]})
+
+    def delete_task(self, id):
+        return self.change('delete_task', id)
+
+    def get_reminded_tasks(self, current_time):
+        # the schedule stays in memory (e.g: in daemon) until the file is changed
+        signature = self.get_signature()
+        (old_signature, schedule) = REMINDER_SCHEDULES.get(self.file_name, (None, None))
+        if schedule is None or old_signature != signature or self.dirty:
+            schedule = ReminderSchedule() if schedule is None else schedule
+            schedule.update(self.get_kanban().tasks, current_time)
+            REMINDER_SCHEDULES[self.file_name] = (signature, schedule)
+        schedule.tick(current_time)
+        return dict(schedule.active_tasks)
+
+class SqliteKanbanStorage(object):
+    '''
+    Kanban stored in a SQLite database. Tasks are updated row by row and indexed by board and by their next reminder time
+    '''
+    SCHEMA = (
+            'CREATE TABLE IF NOT EXISTS boards (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL)',
+            'CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, board INTEGER, '
+                'remind_on TEXT NOT NULL DEFAULT \'\', remind_for NUMERIC NOT NULL, next_reminder REAL)',
+            'CREATE INDEX IF NOT EXISTS tasks_board ON tasks (board)',
+            'CREATE INDEX IF NOT EXISTS tasks_next_reminder ON tasks (next_reminder)',
+        )
+    TASK_COLUMNS = 'id, name, board, remind_on, remind_for'
+
+    def __init__(self, file_name):
+        import sqlite3
+        self.file_name = file_name
+        is_new = not os.path.exists(file_name)
+        self.connection = sqlite3.connect(file_name, timeout = LOCK_TIMEOUT) # SQLite has it's own lock
+        for statement in self.SCHEMA:
+            self.connection.execute(statement)
+        if is_new:
+            for id in sorted(DEFAULT_KANBAN['boards'], key = lambda key: int(key)):
+                self.connection.execute('INSERT INTO boards (id, name) VALUES (?, ?)', (int(id), DEFAULT_KANBAN['boards'][id]))
+        self.connection.commit()
+        self.commit_deferred = False # set while batch is running, it commits once every command is done
+
+    def get_signature(self):
+        return get_file_signature(self.file_name)
+
+    def get_file_names(self):
+        return [self.file_name]
+
+    def reload(self):
+        pass
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def commit(self):
+        if self.commit_deferred:
+            return
+        self.connection.commit()
+
+    def row_to_task(self, row):
+        (id, name, board, remind_on, remind_for) = row[:5]
+        id = str(id)
+        return (id, Task(id, name, str(board) if board is not None else '', remind_on, remind_for))
+
+    def get_next_reminder(self, task, current_time=None):
+        reminder_time = get_next_reminder_time(task['remind_on'], task['remind_for'], time.time() if current_time is None else current_time)
+        return reminder_time[0] if reminder_time is not None else None
+
+    def get_boards(self):
+        return {str(id): name for (id, name) in self.connection.execute('SELECT id, name FROM boards')}
+
+    def get_board_id(self, board):
+        board = str(board)
+        if board.isdigit() and self.connection.execute('SELECT 1 FROM boards WHERE id = ?', (int(board),)).fetchone() is not None: # by id
+            return board
+        # by caption
+        board = board.lower().replace(' ', '')
+        for (id, name) in self.connection.execute('SELECT id, name FROM boards ORDER BY id'):
+            if name.lower().replace(' ', '') == board:
+                return str(id)
+        # by default return the first key
+        row = self.connection.execute('SELECT MIN(id) FROM boards').fetchone()
+        return str(row[0]) if row[0] is not None else ''
+
+    def add_board(self, name, id=None):
+        '''
+        Return id of the new board, None if id exists, or False if id is not a number (ids are the rowid)
+        '''
+        if id is not None and not str(id).isdigit():
+            return False
+        if id is not None and self.connection.execute('SELECT 1 FROM boards WHERE id = ?', (int(id),)).fetchone() is not None:
+            return None
+        cursor = self.connection.execute('INSERT INTO boards (id, name) VALUES (?, ?)', (int(id) if id is not None else None, name))
+        return str(cursor.lastrowid)
+
+    def edit_board(self, id, name):
+        return id.isdigit() and self.connection.execute('UPDATE boards SET name = ? WHERE id = ?', (name, int(id))).rowcount > 0
+
+    def delete_board(self, id):
+        return id.isdigit() and self.connection.execute('DELETE FROM boards WHERE id = ?', (int(id),)).rowcount > 0
+
+    def get_task(self, id):
+        if not id.isdigit():
+            return None
+        row = self.connection.execute('SELECT %s FROM tasks WHERE id = ?' %(self.TASK_COLUMNS,), (int(id),)).fetchone()
+        return self.row_to_task(row)[1].as_dictionary() if row is not None else None
+
+    def get_task_map(self):
+        return dict(self.get_tasks())
+
+    def get_tasks(self, board=None):
+        return list(self.iter_tasks(board))
+
+    def iter_tasks(self, board=None):
+        '''
+        Yield (id, Task) ordered by id straight from the cursor, so that huge kanban is never held in memory
+        '''
+        if board is None:
+            rows = self.connection.execute('SELECT %s FROM tasks ORDER BY id' %(self.TASK_COLUMNS,))
+        else:
+            rows = self.connection.execute('SELECT %s FROM tasks WHERE board = ? ORDER BY id' %(self.TASK_COLUMNS,), (int(board) if board.isdigit() else None,))
+        for row in rows:
+            yield self.row_to_task(row)
+
+    def query_tasks(self, board=None, name=None, due_after=None, due_before=None, has_reminder=None, offset=0, limit=None):
+        '''
+        Same as JsonKanbanStorage.query_tasks, answered by the indexes of tasks table.
+        Name is only narrowed down by LIKE, the words are matched by match_task_name, the same as KanbanIndex does
+        '''
+        (conditions, parameters) = ([], [])
+        if board is not None:
+            conditions.append('board = ?')
+            parameters.append(int(board) if board.isdigit() else None)
+        words = TASK_NAME_TOKEN_PATTERN.findall(name.lower()) if name else []
+        for word in words:
+            if all(ord(character) < 128 for character in word): # LIKE only ignores the case of ASCII letters
+                conditions.append('name LIKE ?')
+                parameters.append('%' + word + '%')
+        if due_after is not None or due_before is not None or has_reminder is not None:
+            self.get_reminded_tasks(time.time()) # roll forward the reminders that are already over
+            if has_reminder is not None:
+                conditions.append('next_reminder IS NOT NULL' if has_reminder else 'next_reminder IS NULL')
+            if due_after is not None:
+                conditions.append('next_reminder >= ?')
+                parameters.append(due_after)
+            if due_before is not None:
+                conditions.append('next_reminder < ?')
+                parameters.append(due_before)
+        query = 'SELECT %s FROM tasks%s ORDER BY id' %(self.TASK_COLUMNS, ' WHERE ' + ' AND '.join(conditions) if conditions else '')
+        if len(words) == 0:
+            parameters += [limit if limit is not None else -1, offset]
+            return [self.row_to_task(row) for row in self.connection.execute(query + ' LIMIT ? OFFSET ?', parameters)]
+        tasks = (self.row_to_task(row) for row in self.connection.execute(query, parameters))
+        tasks = (task for task in tasks if match_task_name(task[1].name, words))
+        return list(itertools.islice(tasks, offset, offset + limit if limit is not None else None))
+
+    def add_task(self, task, id=None):
+        '''
+        Return id of the new task, None if id exists, or False if id is not a number (ids are the rowid)
+        '''
+        if id is not None and not str(id).isdigit():
+            return False
+        if id is not None and self.get_task(str(id)) is not None:
+            return None
+        cursor = self.connection.execute('INSERT INTO tasks (id, name, board, remind_on, remind_for, next_reminder) VALUES (?, ?, ?, ?, ?, ?)',
+                (int(id) if id is not None else None, task['name'], int(task['board']) if str(task['board']).isdigit() else None,
+                    task['remind_on'], task['remind_for'], self.get_next_reminder(task)))
+        return str(cursor.lastrowid)
+
+    def edit_task(self, id, task):
+        return id.isdigit() and self.connection.execute('UPDATE tasks SET name = ?, board = ?, remind_on = ?, remind_for = ?, next_reminder = ? WHERE id = ?',
+                (task['name'], int(task['board']) if str(task['board']).isdigit() else None, task['remind_on'], task['remind_for'],
+                    self.get_next_reminder(task), int(id))).rowcount > 0
+
+    def delete_task(self, id):
+        return id.isdigit() and self.connection.execute('DELETE FROM tasks WHERE id = ?', (int(id),)).rowcount > 0
+
+    def get_reminded_tasks(self, current_time):
+        reminded_tasks = {}
+        rows = self.connection.execute('SELECT %s, next_reminder FROM tasks WHERE next_reminder <= ?' %(self.TASK_COLUMNS,), (current_time,)).fetchall()
+        for row in rows:
+            (id, task) = self.row_to_task(row)
+            next_reminder = self.get_next_reminder(task, current_time)
+            if next_reminder != row[5]: # roll forward the ones that are already over
+                self.connection.execute('UPDATE tasks SET next_reminder = ? WHERE id = ?', (next_reminder, int(id)))
+            if next_reminder is not None and next_reminder <= current_time:
+                reminded_tasks[id] = task
+        if not self.commit_deferred:
+            self.connection.commit()
+        return reminded_tasks
+
+def get_kanban_file_name(name, storage_type):
+    if name is None or name == DEFAULT_KANBAN_NAME:
+        return KANBAN_DATABASE_FILE if storage_type == 'sqlite' else KANBAN_FILE
+    return os.path.join(KANBAN_DIRECTORY, name + ('.db' if storage_type == 'sqlite' else '.json'))
+
+def get_kanban_names(storage_type):
+    '''
+    Return name of every kanban, the default one first
+    '''
+    extension = '.db' if storage_type == 'sqlite' else '.json'
+    try:
+        file_names = os.listdir(KANBAN_DIRECTORY)
+    except OSError: # no named kanban yet
+        file_names = []
+    names = [x[:-len(extension)] for x in file_names if x.endswith(extension)]
+    if BATCH is not None: # kanbans opened by batch are only written when it is done
+        names += [name for (name, type) in BATCH.storages if type == storage_type and name not in names]
+    return [DEFAULT_KANBAN_NAME] + sorted(x for x in names if KANBAN_NAME_PATTERN.match(x) and x not in (DEFAULT_KANBAN_NAME, MERGED_KANBAN_NAME))
+
+def is_kanban_snapshot_stale(file_name):
+    if os.path.abspath(file_name) in JSON_FILE_CACHE or not os.path.exists(file_name):
+        return False
+    try:
+        return os.stat(get_kanban_snapshot_file_name(file_name)).st_mtime < os.stat(file_name).st_mtime
+    except OSError:
+        return True
+
+def refresh_kanban_snapshot(file_name):
+    '''
+    Parse and validate file_name and write it's snapshot, run by the process pool of preload_kanban_files
+    '''
+    load_kanban_file(file_name)
+
+def preload_kanban_files(file_names):
+    '''
+    Kanban files without fresh snapshot are parsed and validated by a process pool at once (each process writes the snapshot),
+    so that loading them afterward only reads their snapshots
+    '''
+    file_names = [x for x in file_names if is_kanban_snapshot_stale(x)]
+    if len(file_names) < 2:
+        return
+    try:
+        import multiprocessing
+        worker_count = min(KANBAN_LOAD_WORKER_COUNT, len(file_names), multiprocessing.cpu_count())
+        if worker_count < 2:
+            return
+        pool = multiprocessing.Pool(worker_count)
+    except (ImportError, OSError, NotImplementedError): # no process pool here, they will be parsed one by one
+        return
+    try:
+        pool.map(refresh_kanban_snapshot, file_names)
+    finally:
+        pool.close()
+        pool.join()
+
+class MergedKanbanStorage(object):
+    '''
+    Read only view of every kanban (kanban:all). Each kanban is still loaded and cached on it's own, only the view is merged:
+    boards with the same caption become one board, and task id is prefixed by kanban name (e.g: work/3)
+    '''
+
+    def __init__(self, storage_type):
+        self.storage_type = storage_type
+        self.storages = None # list of (kanban name, storage)
+        self.boards = None # merged board id : caption
+        self.board_maps = None # kanban name : {board id : merged board id}
+        self.tasks = None # list of (merged task id, Task), only built when every task is needed
+
+    def get_storages(self):
+        if self.storages is None:
+            names = get_kanban_names(self.storage_type)
+            if self.storage_type != 'sqlite':
+                preload_kanban_files([get_kanban_file_name(name, self.storage_type) for name in names])
+            self.storages = [(name, get_storage(name, self.storage_type)) for name in names]
+        return self.storages
+
+    def load(self):
+        if self.boards is not None:
+            return
+        (self.boards, self.board_maps) = ({}, {})
+        captions = {} # caption (lower case, without space) : merged board id
+        for (name, storage) in self.get_storages():
+            boards = storage.get_boards()
+            board_map = self.board_maps[name] = {}
+            for id in sorted(boards, key = lambda key: int(key)):
+                caption = boards[id].lower().replace(' ', '')
+                if caption not in captions:
+                    captions[caption] = str(len(captions) + 1)
+                    self.boards[captions[caption]] = boards[id]
+                board_map[id] = captions[caption]
+
+    def merge_task(self, name, id, task):
+        merged_id = '%s/%s' %(name, id)
+        return (merged_id, Task(merged_id, task.name, self.board_maps[name].get(task.board, ''), task.remind_on, task.remind_for))
+
+    def get_merged_tasks(self):
+        '''
+        Return list of (id, Task) of every kanban, ordered by kanban name and then by id
+        '''
+        self.load()
+        if self.tasks is None:
+            self.tasks = [self.merge_task(name, id, task) for (name, storage) in self.get_storages() for (id, task) in storage.get_tasks()]
+        return self.tasks
+
+    def get_signature(self):
+        return tuple(storage.get_signature() for (name, storage) in self.get_storages()) + (get_file_signature(KANBAN_DIRECTORY),)
+
+    def get_file_names(self):
+        return [storage.file_name for (name, storage) in self.get_storages()]
+
+    def reload(self):
+        # kanbans might have been added or removed as well
+        (self.storages, self.boards, self.board_maps, self.tasks) = (None, None, None, None)
+
+    def commit(self):
+        pass
+
+    def get_boards(self):
+        self.load()
+        return dict(self.boards)
+
+    def get_board_id(self, board):
+        self.load()
+        return find_board_id(self.boards, board)
+
+    def get_task(self, id):
+        task = self.get_task_map().get(id)
+        return task.as_dictionary() if task is not None else None
+
+    def get_task_map(self):
+        return dict(self.get_merged_tasks())
+
+    def get_tasks(self, board=None):
+        return list(self.iter_tasks(board))
+
+    def iter_tasks(self, board=None):
+        for (id, task) in self.get_merged_tasks():
+            if board is None or task.board == board:
+                yield (id, task)
+
+    def query_tasks(self, board=None, offset=0, limit=None, **filters):
+        '''
+        Same as JsonKanbanStorage.query_tasks, every kanban answers the query by it's own index
+        '''
+        self.load()
+        tasks = []
+        for (name, storage) in self.get_storages():
+            board_ids = [None] if board is None else [x for x in self.board_maps[name] if self.board_maps[name][x] == board]
+            kanban_tasks = []
+            for board_id in board_ids:
+                kanban_tasks += storage.query_tasks(board = board_id, limit = offset + limit if limit is not None else None, **filters)
+            for (id, task) in sorted(kanban_tasks, key = lambda item: int(item[0])):
+                tasks.append(self.merge_task(name, id, task))
+            if limit is not None and len(tasks) >= offset + limit:
+                break
+        return tasks[offset:offset + limit] if limit is not None else tasks[offset:]
+
+    def get_reminded_tasks(self, current_time):
+        self.load()
+        reminded_tasks = {}
+        for (name, storage) in self.get_storages():
+            for (id, task) in storage.get_reminded_tasks(current_time).items():
+                (merged_id, merged_task) = self.merge_task(name, id, task)
+                reminded_tasks[merged_id] = merged_task
+        return reminded_tasks
+
+class Batch(object):
+    '''
+    State shared by the commands run by batch: every kanban is opened once, and configuration is kept in memory.
+    Nothing is written until save(), rollback() throws every change away
+    '''
+
+    def __init__(self):
+        self.storages = {} # (kanban name, storage type) : storage
+        self.configuration = None # as changed by the commands
+        self.original_configuration = None
+        self.failed = False # a command has reported a problem
+
+    def get_storage(self, name, storage_type):
+        key = (name, storage_type)
+        if key not in self.storages:
+            storage = create_storage(name, storage_type)
+            storage.commit_deferred = True
+            self.storages[key] = storage
+        return self.storages[key]
+
+    def get_configuration(self, load_function):
+        if self.configuration is None:
+            self.configuration = load_function()
+            self.original_configuration = copy_configuration(self.configuration)
+        return copy_configuration(self.configuration)
+
+    def save(self):
+        '''
+        Commit every kanban once, and write the changed configuration keys on top of the current configuration file.
+        Should be called after BATCH is reset, so that load_configuration and save_configuration use the file
+        '''
+        for storage in self.storages.values():
+            storage.commit_deferred = False
+            storage.commit()
+        if self.configuration is not None and self.configuration != self.original_configuration:
+            with FileLock(CONFIGURATION_FILE):
+                configuration = load_configuration()
+                for key in self.configuration:
+                    if self.configuration[key] != self.original_configuration.get(key):
+                        configuration[key] = self.configuration[key]
+                save_configuration(configuration)
+
+    def rollback(self):
+        for storage in self.storages.values():
+            storage.rollback()
+
+BATCH = None # Batch being run by batch command
+
+def print_error(message):
+    '''
+    Print problem reported by a command, and mark the batch being run as failed
+    '''
+    print(message)
+    if BATCH is not None:
+        BATCH.failed = True
+
+def open_storage(name=None, merged=False):
+    '''
+    Open kanban called name (default kanban if it is None). "all" opens every kanban merged (read only), only if merged is True.
+    Print the problem and return None if name is invalid
+    '''
+    configuration = load_configuration()
+    name = str(name) if name is not None else DEFAULT_KANBAN_NAME
+    if name == MERGED_KANBAN_NAME:
+        if merged:
+            return MergedKanbanStorage(configuration['storage'])
+        print_error('Kanban %s can only be viewed, you should specify a kanban name' %(name,))
+        return None
+    if not KANBAN_NAME_PATTERN.match(name):
+        print_error('Invalid kanban name: %s' %(name,))
+        return None
+    if name != DEFAULT_KANBAN_NAME and not os.path.isdir(KANBAN_DIRECTORY):
+        os.makedirs(KANBAN_DIRECTORY)
+    return get_storage(name, configuration['storage'])
+
+def create_storage(name, storage_type):
+    file_name = get_kanban_file_name(name, storage_type)
+    if storage_type == 'sqlite':
+        return SqliteKanbanStorage(file_name)
+    return JsonKanbanStorage(file_name)
+
+def get_storage(name, storage_type):
+    '''
+    Return storage of kanban called name, commands run by batch share the same one
+    '''
+    if BATCH is not None:
+        return BATCH.get_storage(name, storage_type)
+    return create_storage(name, storage_type)
 
 def get_reminded_tasks():
-    kanban = load_kanban()
-    tasks = kanban['tasks']
-    current_time = time.time()
-    reminded_tasks = {}
-    for task_id in tasks.keys():
-        task = tasks[task_id]
-        if complete_str_timestamp(task['remind_on'].strip()) != '':
-            time_start = str_to_timestamp(task['remind_on'])
-            time_stop = time_start + float(task['remind_for'])
-            if time_start < current_time and time_stop > current_time:
-                reminded_tasks[task_id] = task
-    return reminded_tasks
+    return open_storage().get_reminded_tasks(time.time())
 
 def add_task(arg_dict={}):
-    kanban = load_kanban()
+    storage = open_storage(arg_dict.get('kanban'))
+    if storage is None:
+        return
     if 'name' in arg_dict.keys():
-        id = arg_dict['id'] if 'id' in arg_dict.keys() else generate_dictionary_id(kanban['tasks'])
-        id = str(id)
-        task = DEFAULT_TASK
-        if id not in kanban['tasks'].keys():
+        id = str(arg_dict['id']) if 'id' in arg_dict.keys() else None
+        task = dict(DEFAULT_TASK)
+        if id is not None and not id.isdigit():
+            print_error('Task id should be a number: %s' %(id,))
+        elif not is_valid_remind_on(arg_dict.get('remind_on', '')):
+            print_error('Invalid remind_on format: %s' %(arg_dict['remind_on'],))
+        elif id is None or storage.get_task(id) is None:
             # modify task
             for task_key in ('name', 'remind_on', 'remind_for'):
                 if task_key in arg_dict.keys():
                     task[task_key] = arg_dict[task_key]
             # modify task's board
             if 'board' in arg_dict.keys():
-                task['board'] = get_board_id(arg_dict['board'])
+                task['board'] = storage.get_board_id(arg_dict['board'])
             else:
-                task['board'] = get_board_id('')
-            kanban['tasks'][id] = task
-            save_kanban(kanban)
+                task['board'] = storage.get_board_id('')
+            storage.add_task(task, id)
+            storage.commit()
         else:
-            print('Task with id %s already exists' %(id,))
+            print_error('Task with id %s already exists' %(id,))
     else:
-        print('You should specify task name')
+        print_error('You should specify task name')
 
 def edit_task(arg_dict={}):
-    kanban = load_kanban()
+    storage = open_storage(arg_dict.get('kanban'))
+    if storage is None:
+        return
     if 'id' in arg_dict.keys():
         id = str(arg_dict['id'])
-        if id in kanban['tasks'].keys():
-            # get old task
-            task = kanban['tasks'][id]
+        task = storage.get_task(id)
+        if not is_valid_remind_on(arg_dict.get('remind_on', '')):
+            print_error('Invalid remind_on format: %s' %(arg_dict['remind_on'],))
+        elif task is not None:
             # modify task
             for task_key in ('name', 'remind_on', 'remind_for'):
                 if task_key in arg_dict.keys():
                     task[task_key] = arg_dict[task_key]
             # modify task's board
             if 'board' in arg_dict.keys():
-                task['board'] = get_board_id(arg_dict['board'])
-            else:
-                task['board'] = get_board_id('')
-            kanban['tasks'][id] = task
-            save_kanban(kanban)
+                task['board'] = storage.get_board_id(arg_dict['board'])
+            storage.edit_task(id, task)
+            storage.commit()
         else:
-            print('Task with id %s doesn\'t exists' %(id,))
+            print_error('Task with id %s doesn\'t exists' %(id,))
     else:
-        print('You should specify task id')
+        print_error('You should specify task id')
 
 def delete_task(arg_dict={}):
-    kanban = load_kanban()
+    storage = open_storage(arg_dict.get('kanban'))
+    if storage is None:
+        return
     if 'id' in arg_dict.keys():
         id = str(arg_dict['id'])
-        if id in kanban['tasks'].keys():
-            kanban['tasks'].pop(id, None) # delete from kanban['tasks']
-            save_kanban(kanban)
+        if storage.delete_task(id):
+            storage.commit()
         else:
-            print('Task with id %s doesn\'t exists' %(id,))
+            print_error('Task with id %s doesn\'t exists' %(id,))
     else:
-        print('You should specify task id')
+        print_error('You should specify task id')
+
+def get_task_filters(storage, arg_dict):
+    '''
+    Return filters for storage.query_tasks from board, name, due_after, due_before, has_reminder, offset, and limit arguments.
+    Print the problem and return None if any of them is invalid
+    '''
+    filters = {}
+    if 'board' in arg_dict.keys():
+        board = str(arg_dict['board'])
+        board_id_map = get_board_id_map(storage.get_boards())
+        if board not in board_id_map and board.lower().replace(' ', '') not in board_id_map:
+            print_error('Board %s doesn\'t exists' %(board,))
+            return None
+        filters['board'] = storage.get_board_id(board)
+    if 'name' in arg_dict.keys():
+        filters['name'] = arg_dict['name'] if is_string_or_unicode(arg_dict['name']) else str(arg_dict['name'])
+    for key in ('due_after', 'due_before'):
+        if key in arg_dict.keys():
+            filters[key] = get_agenda_time(arg_dict[key], None)
+            if filters[key] is None:
+                print_error('Invalid %s: %s' %(key, arg_dict[key]))
+                return None
+    if 'has_reminder' in arg_dict.keys():
+        filters['has_reminder'] = arg_dict['has_reminder'] == True
+    for key in ('offset', 'limit'):
+        if key in arg_dict.keys():
+            if type(arg_dict[key]) != int or arg_dict[key] < 0:
+                print_error('Invalid %s: %s' %(key, arg_dict[key]))
+                return None
+            filters[key] = arg_dict[key]
+    return filters
 
 def show_task(arg_dict={}):
-    kanban = load_kanban()
-    boards = kanban['boards']
-    tasks = kanban['tasks']
-    for id in sorted(tasks, key = lambda key: int(key)):
-        task = tasks[id]
-        task_name = task['name']
-        task_board = boards[task['board']] if task['board'] in boards.keys() else ''
-        remind_on = task['remind_on']
-        remind_for = task['remind_for']
+    storage = open_storage(arg_dict.get('kanban'), merged = True)
+    if storage is None:
+        return
+    boards = storage.get_boards()
+    if 'id' in arg_dict.keys(): # a single task, read without loading the whole kanban
+        id = str(arg_dict['id'])
+        task = storage.get_task(id)
+        if task is None:
+            print_error('Task with id %s doesn\'t exists' %(id,))
+            return
+        tasks = [(id, Task.from_dictionary(id, task))]
+    else:
+        filters = get_task_filters(storage, arg_dict)
+        if filters is None:
+            return
+        tasks = storage.query_tasks(**filters)
+    for (id, task) in tasks:
+        task_name = task.name
+        task_board = boards[task.board] if task.board in boards.keys() else ''
+        remind_on = task.remind_on
+        remind_for = task.remind_for
         print('%s. \t %s \t %s \t %s \t %s' %(id, task_name, task_board, remind_on, remind_for))
 
 def add_board(arg_dict={}):
-    kanban = load_kanban()
+    storage = open_storage(arg_dict.get('kanban'))
+    if storage is None:
+        return
     if 'name' in arg_dict.keys():
-        id = arg_dict['id'] if 'id' in arg_dict.keys() else generate_dictionary_id(kanban['boards'])
-        id = str(id)
+        id = str(arg_dict['id']) if 'id' in arg_dict.keys() else None
         name = arg_dict['name']
-        if id not in kanban['boards'].keys():
-            kanban['boards'][id] = name
-            save_kanban(kanban)
+        if id is not None and not id.isdigit():
+            print_error('Board id should be a number: %s' %(id,))
+        elif storage.add_board(name, id) is not None:
+            storage.commit()
         else:
-            print('Board with id %s already exists' %(id,))
+            print_error('Board with id %s already exists' %(id,))
     else:
-        print('You should specify board name')
+        print_error('You should specify board name')
 
 def edit_board(arg_dict={}):
-    kanban = load_kanban()
+    storage = open_storage(arg_dict.get('kanban'))
+    if storage is None:
+        return
     if 'id' in arg_dict.keys() and 'name' in arg_dict.keys():
         id = str(arg_dict['id'])
         name = arg_dict['name']
-        if id in kanban['boards'].keys():
-            kanban['boards'][id] = name
-            save_kanban(kanban)
+        if storage.edit_board(id, name):
+            storage.commit()
         else:
-            print('Board with id %s doesn\'t exists' %(id,))
+            print_error('Board with id %s doesn\'t exists' %(id,))
     else:
-        print('You should specify board id and name')
+        print_error('You should specify board id and name')
 
 def delete_board(arg_dict={}):
-    kanban = load_kanban()
+    storage = open_storage(arg_dict.get('kanban'))
+    if storage is None:
+        return
     if 'id' in arg_dict.keys():
         id = str(arg_dict['id'])
-        if id in kanban['boards'].keys():
-            kanban['boards'].pop(id, None) # delete from kanban['boards']
-            save_kanban(kanban)
+        if storage.delete_board(id):
+            storage.commit()
         else:
-            print('Board with id %s doesn\'t exists' %(id,))
+            print_error('Board with id %s doesn\'t exists' %(id,))
     else:
-        print('You should specify board id')
+        print_error('You should specify board id')
+
+def show_kanban(arg_dict={}):
+    configuration = load_configuration()
+    for name in get_kanban_names(configuration['storage']):
+        print('%s \t %s' %(name, get_kanban_file_name(name, configuration['storage'])))
 
 def show_board(arg_dict={}):
-    kanban = load_kanban()
-    boards = kanban['boards']
+    storage = open_storage(arg_dict.get('kanban'), merged = True)
+    if storage is None:
+        return
+    boards = storage.get_boards()
     for id in sorted(boards, key = lambda key: int(key)):
         print('%s. \t %s' %(id, boards[id]))
 
-def edit_config(arg_dict={}):
+def migrate_kanban(arg_dict={}):
+    '''
+    Copy every board and task from kanban.json (and every named kanban) into SQLite databases, and use them as storage.
+    Databases that already have tasks (or changed boards) are only replaced with force:true, otherwise nothing is migrated
+    '''
+    names = get_kanban_names('json')
+    if arg_dict.get('force', False) != True:
+        for name in names:
+            file_name = get_kanban_file_name(name, 'sqlite')
+            if not os.path.exists(file_name):
+                continue
+            storage = SqliteKanbanStorage(file_name)
+            if storage.connection.execute('SELECT 1 FROM tasks LIMIT 1').fetchone() is not None or storage.get_boards() != DEFAULT_KANBAN['boards']:
+                print_error('%s already has tasks or boards, add force:true to replace them' %(file_name,))
+                return
+    for name in names:
+        kanban = load_kanban(get_kanban_file_name(name, 'json'))
+        file_name = get_kanban_file_name(name, 'sqlite')
+        storage = SqliteKanbanStorage(file_name)
+        storage.connection.execute('DELETE FROM tasks')
+        storage.connection.execute('DELETE FROM boards')
+        (board_count, task_count) = (0, 0)
+        for id in kanban.boards:
+            if storage.add_board(kanban.boards[id], id) is False:
+                print('Board with id %s is skipped, SQLite ids should be numbers' %(id,))
+            else:
+                board_count += 1
+        for id in kanban.tasks:
+            if storage.add_task(kanban.tasks[id].as_dictionary(), id) is False:
+                print('Task with id %s is skipped, SQLite ids should be numbers' %(id,))
+            else:
+                task_count += 1
+        storage.commit()
+        print('%d boards and %d tasks have been migrated to %s' %(board_count, task_count, file_name))
     configuration = load_configuration()
-    for key in arg_dict.keys():
-        if key in configuration:
-            configuration[key] = arg_dict[key]
+    configuration['storage'] = 'sqlite'
     save_configuration(configuration)
 
+def find_board_id(boards, board):
+    '''
+    Return id of board (id or caption) in boards, or the first board id if there is no such board
+    '''
+    board_id_map = get_board_id_map(boards)
+    board = str(board)
+    if board in boards: # by id
+        return board
+    elif board.lower().replace(' ', '') in board_id_map: # by caption
+        return board_id_map[board.lower().replace(' ', '')]
+    # by default return the first key
+    for board in sorted(boards, key = lambda key: int(key)):
+        return board
+    return ''
+
+def get_board_id_map(boards):
+    '''
+    Return {board id or caption (lower case, without space) : board id}, so that board of many tasks can be resolved without asking the storage.
+    Same rules as get_board_id: id first, then caption of the smallest id
+    '''
+    board_id_map = {}
+    for id in sorted(boards, key = lambda key: int(key), reverse = True):
+        board_id_map[boards[id].lower().replace(' ', '')] = id
+    for id in boards:
+        board_id_map[id] = id
+    return board_id_map
+
+def get_task_file_format(file_name, format=None):
+    if format:
+        return str(format).lower()
+    return 'csv' if file_name.lower().endswith('.csv') else 'ndjson'
+
+def read_task_records(infile, format):
+    '''
+    Yield (line_number, record, error) of every task in NDJSON or CSV (with header) stream, error is None for valid record
+    '''
+    if format == 'csv':
+        import csv
+        reader = csv.DictReader(infile)
+        for record in reader:
+            for key in record.keys():
+                if type(record[key]) == str: # csv module of python 2 only read bytes
+                    record[key] = record[key].decode('utf-8')
+            yield (reader.line_num, record, None)
+        return
+    for (index, line) in enumerate(infile):
+        line = line.strip()
+        if line == '':
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield (index + 1, None, 'Invalid JSON')
+            continue
+        if not is_dict(record):
+            yield (index + 1, None, 'Record should be an object')
+            continue
+        yield (index + 1, record, None)
+
+def record_to_task(record, board_id_map, default_board_id):
+    '''
+    Return (id, task, error). id is None if it is not specified
+    '''
+    id = record.get('id')
+    id = str(id) if id not in (None, '') else None
+    if id is not None and not id.isdigit():
+        return (id, None, 'Invalid id: %s' %(id,))
+    name = record.get('name')
+    if name in (None, ''):
+        return (id, None, 'You should specify task name')
+    task = dict(DEFAULT_TASK)
+    task['name'] = name if is_string_or_unicode(name) else str(name)
+    remind_on = record.get('remind_on')
+    task['remind_on'] = remind_on if remind_on is not None else ''
+    if not is_string_or_unicode(task['remind_on']) or not is_valid_remind_on(task['remind_on']):
+        return (id, None, 'Invalid remind_on format: %s' %(remind_on,))
+    remind_for = record.get('remind_for')
+    if remind_for not in (None, ''):
+        if not is_numeric(remind_for):
+            try:
+                remind_for = int(remind_for) if str(remind_for).isdigit() else float(remind_for)
+            except ValueError:
+                return (id, None, 'Invalid remind_for: %s' %(remind_for,))
+        task['remind_for'] = remind_for
+    board = record.get('board')
+    board = str(board).lower().replace(' ', '') if board is not None else ''
+    task['board'] = board_id_map.get(board, default_board_id)
+    return (id, task, None)
+
+def import_tasks(arg_dict={}):
+    '''
+    Add every task from NDJSON or CSV file (or stdin) to the kanban at once.
+    Invalid records and duplicate ids are reported and skipped, the rest are saved by a single commit
+    '''
+    file_name = str(arg_dict.get('file', '-'))
+    format = get_task_file_format(file_name, arg_dict.get('format'))
+    if format not in ('ndjson', 'csv'):
+        print_error('Invalid format: %s' %(format,))
+        return
+    storage = open_storage(arg_dict.get('kanban'))
+    if storage is None:
+        return
+    boards = storage.get_boards()
+    board_id_map = get_board_id_map(boards)
+    default_board_id = storage.get_board_id('')
+    (imported_count, skipped_count) = (0, 0)
+    try:
+        infile = sys.stdin if file_name == '-' else open(file_name, 'r')
+    except (IOError, OSError):
+        print_error('Cannot read %s' %(file_name,))
+        return
+    try:
+        for (line_number, record, error) in read_task_records(infile, format):
+            if error is None:
+                (id, task, error) = record_to_task(record, board_id_map, default_board_id)
+            if error is None and storage.add_task(task, id) is None:
+                error = 'Task with id %s already exists' %(id,)
+            if error is not None:
+                print('Line %d: %s' %(line_number, error))
+                skipped_count += 1
+                continue
+            imported_count += 1
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+    storage.commit()
+    print('%d tasks imported, %d records skipped' %(imported_count, skipped_count))
+
+def write_task_records(outfile, format, tasks, boards):
+    '''
+    Write (id, Task) from tasks one by one as NDJSON or CSV (with header). Board is written as it's caption
+    '''
+    fields = ('id', 'name', 'board', 'remind_on', 'remind_for')
+    if format == 'csv':
+        import csv
+        writer = csv.writer(outfile)
+        writer.writerow(fields)
+    for (id, task) in tasks:
+        values = (id, task.name, boards.get(task.board, task.board), task.remind_on, task.remind_for)
+        if format == 'csv':
+            writer.writerow([x.encode('utf-8') if type(x) == unicode else x for x in values])
+        else:
+            outfile.write(json.dumps(collections.OrderedDict(zip(fields, values))) + '\n')
+
+def export_tasks(arg_dict={}):
+    '''
+    Write every task (or only tasks of a board) as NDJSON or CSV to file (or stdout)
+    '''
+    file_name = str(arg_dict.get('file', '-'))
+    format = get_task_file_format(file_name, arg_dict.get('format'))
+    if format not in ('ndjson', 'csv'):
+        print_error('Invalid format: %s' %(format,))
+        return
+    storage = open_storage(arg_dict.get('kanban'))
+    if storage is None:
+        return
+    boards = storage.get_boards()
+    board = storage.get_board_id(arg_dict['board']) if 'board' in arg_dict.keys() else None
+    try:
+        outfile = sys.stdout if file_name == '-' else open(file_name, 'w')
+    except (IOError, OSError):
+        print_error('Cannot write %s' %(file_name,))
+        return
+    try:
+        write_task_records(outfile, format, storage.iter_tasks(board), boards)
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
+def read_batch_commands(infile):
+    '''
+    Return list of (line number, command, arguments) from batch script, one command per line as on the command line
+    (e.g: edit-task id:3, board:done), empty lines and lines starting with # are skipped.
+    Print the problem and return None if any line is invalid, so that nothing runs
+    '''
+    commands = []
+    for (line_number, line) in enumerate(infile, 1):
+        line = line.strip()
+        if line == '' or line.startswith('#'):
+            continue
+        (command, arg_string) = (line.split(None, 1) + [''])[:2]
+        arg_dict = str_as_dictionary(arg_string)
+        if command not in command_list:
+            print('Line %d: unknown command %s' %(line_number, command))
+            return None
+        if command in BATCH_EXCLUDED_COMMANDS or ('%s' %(arg_dict.get('mode', ''),)).lower() == 'watch' or \
+                (command == 'stats' and arg_dict.get('compact', False) == True): # rewrites session log right away
+            print('Line %d: %s can\'t be run by batch' %(line_number, command))
+            return None
+        if arg_string.strip() != '' and len(arg_dict) == 0:
+            print('Line %d: invalid arguments %s' %(line_number, arg_string))
+            return None
+        commands.append((line_number, command, arg_dict))
+    return commands
+
+def batch(arg_dict={}):
+    '''
+    Run commands from file (or stdin) in this process. Every command works on the same kanban and configuration in memory,
+    they are saved once all commands are done, and nothing is saved if a command fails or reports a problem
+    (strict:false skips the commands that report a problem instead)
+    '''
+    global BATCH
+    file_name = str(arg_dict.get('file', '-'))
+    strict = arg_dict.get('strict', True) != False
+    try:
+        infile = sys.stdin if file_name == '-' else open(file_name, 'r')
+    except (IOError, OSError):
+        print('Cannot read %s' %(file_name,))
+        return
+    try:
+        commands = read_batch_commands(infile)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+    if commands is None:
+        return
+    state = BATCH = Batch()
+    done = False
+    try:
+        for (line_number, command, command_arg_dict) in commands:
+            try:
+                command_list[command](command_arg_dict)
+            except Exception as e:
+                print('Line %d: %s failed (%s), nothing has been saved' %(line_number, command, e))
+                return
+            if strict and state.failed:
+                print('Line %d: %s failed, nothing has been saved' %(line_number, command))
+                return
+        done = True
+    finally:
+        BATCH = None
+        if not done: # failed or interrupted
+            state.rollback()
+    state.save()
+
+def get_agenda_time(string, default):
+    '''
+    Return timestamp of from/to argument: now, date (e.g: 2016-05-26), or any remind_on format (e.g: 2016-05-26 17:00, tuesday 08:00).
+    A repeating remind_on (e.g: tuesday 08:00, *-*-26 08:00) is it's next occurrence
+    '''
+    string = ('%s' %(string,)).strip().lower() if string is not None else ''
+    if string == '':
+        return default
+    now = time.time()
+    if string == 'now':
+        return now
+    if REMINDER_DATE_PATTERN.match(string):
+        string += ' 00:00'
+    rule = compile_remind_on(string)
+    if rule is None:
+        return None
+    if rule.kind == 'once':
+        return str_to_timestamp(string)
+    occurrence = rule.get_next_occurrence(now, 0)
+    return occurrence[0] if occurrence is not None else None
+
+def iter_pattern_occurrences(rules, time_from, time_to):
+    '''
+    Yield (time_start, time_stop, id key, id, Task) ordered by time for rules sharing the same dates (e.g: every daily rule).
+    rules is list of (ReminderRule, remind_for, [(id key, id, Task)]). The dates are computed once, and occurrences are sorted day by day
+    '''
+    first_date = datetime.date.fromtimestamp(time_from - max(remind_for for (rule, remind_for, group) in rules))
+    for date in rules[0][0].iter_dates(first_date):
+        (day_start, day_length) = get_day_start(date)
+        if day_start >= time_to:
+            return
+        occurrences = []
+        for (rule, remind_for, group) in rules:
+            if day_length == 86400:
+                time_start = day_start + rule.hour * 3600 + rule.minute * 60 + rule.second
+            else:
+                time_start = rule.get_time_start(date)
+            time_stop = time_start + remind_for
+            if time_start < time_to and time_stop > time_from:
+                for (key, id, task) in group:
+                    occurrences.append((time_start, time_stop, key, id, task))
+        occurrences.sort()
+        for occurrence in occurrences:
+            yield occurrence
+
+def iter_agenda(tasks, time_from, time_to):
+    '''
+    Yield (time_start, time_stop, id, Task) of every reminder occurrence overlapping [time_from, time_to), ordered by time.
+    Tasks are grouped by their dates (e.g: every tuesday), each group is expanded lazily and the groups are merged through a heap
+    '''
+    rules = collections.OrderedDict() # (remind_on, remind_for) : (ReminderRule, remind_for, [(id key, id, Task)])
+    for (id, task) in tasks:
+        rule = compile_remind_on(task.remind_on)
+        if rule is not None:
+            remind_for = float(task.remind_for)
+            if (task.remind_on, remind_for) not in rules:
+                rules[(task.remind_on, remind_for)] = (rule, remind_for, [])
+            rules[(task.remind_on, remind_for)][2].append((int(id) if id.isdigit() else id, id, task))
+    patterns = collections.OrderedDict() # (kind, year, month, day, weekday) : rules sharing the dates
+    for (rule, remind_for, group) in rules.values():
+        patterns.setdefault((rule.kind, rule.year, rule.month, rule.day, rule.weekday), []).append((rule, remind_for, group))
+    streams = [iter_pattern_occurrences(pattern_rules, time_from, time_to) for pattern_rules in patterns.values()]
+    for (time_start, time_stop, key, id, task) in heapq.merge(*streams):
+        yield (time_start, time_stop, id, task)
+
+def agenda(arg_dict={}):
+    storage = open_storage(arg_dict.get('kanban'), merged = True)
+    if storage is None:
+        return
+    time_from = get_agenda_time(arg_dict.get('from'), time.time())
+    if time_from is None:
+        print_error('Invalid from: %s' %(arg_dict['from'],))
+        return
+    time_to = get_agenda_time(arg_dict.get('to'), time_from + AGENDA_DEFAULT_RANGE)
+    if time_to is None:
+        print_error('Invalid to: %s' %(arg_dict['to'],))
+        return
+    board = storage.get_board_id(arg_dict['board']) if 'board' in arg_dict.keys() else None
+    boards = storage.get_boards()
+    formatted_times = {} # many occurrences share their start/stop
+    lines = []
+    for (time_start, time_stop, id, task) in iter_agenda(storage.iter_tasks(board), time_from, time_to):
+        for timestamp in (time_start, time_stop):
+            if timestamp not in formatted_times:
+                formatted_times[timestamp] = timestamp_to_str(timestamp)
+        lines.append('%s - %s \t %s. \t %s \t %s\n' %(formatted_times[time_start], formatted_times[time_stop], id, task.name, boards.get(task.board, '')))
+        if len(lines) >= AGENDA_BUFFER_SIZE: # stream the output, a few lines at once
+            sys.stdout.write(''.join(lines))
+            lines = []
+    sys.stdout.write(''.join(lines))
+
+def edit_config(arg_dict={}):
+    with FileLock(CONFIGURATION_FILE):
+        configuration = load_configuration()
+        for key in arg_dict.keys():
+            if key in configuration:
+                configuration[key] = arg_dict[key]
+        save_configuration(configuration)
+
 def show_config(arg_dict={}):
     configuration = load_configuration()
     for key in configuration.keys():
         print('%s\t:%s' %(key.ljust(20,' '), configuration[key]))
 
+def get_kanban_cell(task_id, task, mode):
+    if mode.lower() == 'minimal' or mode.lower() == 'mini':
+        return '%s. %s' %(task_id, task.name)
+    return '%s. %s %s' %(task_id, task.name, task.remind_on)
+
+class KanbanCells(object):
+    '''
+    Column of a board (the caption, and then a cell for every task). A cell is only formatted when it is drawn,
+    and the width is counted from the lengths of task ids, names and remind_on without formatting any cell
+    '''
+
+    def __init__(self, name, tasks, mode=''):
+        self.name = name
+        self.tasks = tasks
+        self.minimal = mode.lower() == 'minimal' or mode.lower() == 'mini'
+        self.width = None
+
+    def __len__(self):
+        return len(self.tasks) + 1
+
+    def __getitem__(self, index):
+        if index == 0:
+            return self.name
+        (task_id, task) = self.tasks[index - 1]
+        return get_kanban_cell(task_id, task, 'mini' if self.minimal else '')
+
+    def get_width(self):
+        if self.width is None:
+            width = len(self.name)
+            for (task_id, task) in self.tasks: # same length as get_kanban_cell
+                cell_width = len(task_id) + len(task.name) + 2 + (0 if self.minimal else len(task.remind_on) + 1)
+                if cell_width > width:
+                    width = cell_width
+            self.width = width
+        return self.width
+
+def get_kanban_board_tasks(storage, filters=None):
+    '''
+    Return OrderedDict of {board id : (board name, list of (task id, Task))}, only boards having (matching) tasks are included
+    '''
+    board_names = storage.get_boards()
+    board_tasks = {}
+    for (task_id, task) in (storage.query_tasks(**filters) if filters else storage.get_tasks()):
+        board_tasks.setdefault(task.board, []).append((task_id, task))
+    boards = collections.OrderedDict()
+    for board_id in sorted(board_names, key = lambda key: int(key)):
+        if board_id in board_tasks:
+            boards[board_id] = (board_names[board_id], board_tasks[board_id])
+    return boards
+
 def kanban(arg_dict={}):
     mode = arg_dict['mode'] if 'mode' in arg_dict.keys() else ''
-    kanban = load_kanban()
-    boards = kanban['boards']
-    tasks = kanban['tasks']
-    # get all board_id that have at least one task
-    task_boards = [tasks[task_id]['board'] for task_id in tasks if tasks[task_id]['board'] in boards]
-    # let boards on contains board having tasks
-    boards = {x:boards[x] for x in boards if x in task_boards}
-    # get board's tasks and max_task_count
-    max_task_count = 0
-    for board_id in boards:
-        board_name = boards[board_id]
-        boards[board_id] = {
-                'name' : board_name,
-                'tasks' : []
-            }
-        for task_id in tasks.keys():
-            task = tasks[task_id]
-            if task['board'] == board_id:
-                task['id'] = task_id
-                boards[board_id]['tasks'].append(task)
-        task_count = len(boards[board_id]['tasks'])
-        if task_count > max_task_count:
-            max_task_count = task_count
-    # assemble outputs
-    outputs = [[]]
-    # captions
-    for key in boards.keys():
-        outputs[0].append(boards[key]['name'])
-    for i in range(max_task_count):
+    if mode.lower() == 'watch':
+        return watch_kanban(arg_dict)
+    storage = open_storage(arg_dict.get('kanban'), merged = True)
+    if storage is None:
+        return
+    filters = get_task_filters(storage, arg_dict)
+    if filters is None:
+        return
+    boards = get_kanban_board_tasks(storage, filters)
+    columns = [KanbanCells(name, tasks, mode) for (name, tasks) in boards.values()]
+    row_count = max([len(tasks) for (name, tasks) in boards.values()] + [0])
+    page = get_kanban_page(arg_dict, row_count)
+    if page is None:
+        return
+    (row_start, row_stop) = page
+    # widths come from every task of the boards, so they don't change between pages
+    print_table(columns, [cells.get_width() for cells in columns], row_start, row_stop)
+    if 'page' in arg_dict.keys() or 'page_size' in arg_dict.keys():
+        page_size = arg_dict.get('page_size', KANBAN_PAGE_SIZE)
+        page_count = max((row_count + page_size - 1) // page_size, 1)
+        print('Page %d of %d (rows %d-%d of %d)' %(arg_dict.get('page', 1), page_count, min(row_start + 1, row_count), row_stop, row_count))
+
+def get_kanban_page(arg_dict, row_count):
+    '''
+    Return (row_start, row_stop) of the rows shown by kanban from page (starts from 1) and page_size arguments, all rows by default.
+    Print the problem and return None if any of them is invalid
+    '''
+    for key in ('page', 'page_size'):
+        if key in arg_dict.keys() and (type(arg_dict[key]) != int or arg_dict[key] < 1):
+            print_error('Invalid %s: %s' %(key, arg_dict[key]))
+            return None
+    if 'page' not in arg_dict.keys() and 'page_size' not in arg_dict.keys():
+        return (0, row_count)
+    page_size = arg_dict.get('page_size', KANBAN_PAGE_SIZE)
+    row_start = (arg_dict.get('page', 1) - 1) * page_size
+    if row_start > 0 and row_start >= row_count:
+        print_error('Page %s doesn\'t exists, there are only %d pages' %(arg_dict['page'], max((row_count + page_size - 1) // page_size, 1)))
+        return None
+    return (row_start, min(row_start + page_size, row_count))
+
+class KanbanView(object):
+    '''
+    Screen of "kanban mode:watch". A board column is only rebuilt when it's tasks have been changed,
+    and only the changed part of every line is sent to the terminal (by moving the cursor there)
+    '''
+
+    def __init__(self, mode='', outfile=None):
+        self.mode = mode
+        self.outfile = sys.stdout if outfile is None else outfile
+        self.columns = {} # board id : (key, KanbanCells)
+        self.lines = [] # lines on the screen
+        self.size = None
+
+    def get_column(self, board_id, name, tasks):
+        key = (name, [(task_id, task.name, task.remind_on) for (task_id, task) in tasks])
+        column = self.columns.get(board_id)
+        if column is None or column[0] != key:
+            column = self.columns[board_id] = (key, KanbanCells(name, tasks, self.mode))
+        return column[1]
+
+    def update(self, boards, size):
+        '''
+        Redraw the screen for boards (see get_kanban_board_tasks), size is (rows, cols) of the terminal
+        '''
+        if size != self.size: # everything has been moved, start over
+            (self.size, self.lines) = (size, [])
+            self.outfile.write('\033[H\033[2J')
+        columns = [self.get_column(board_id, name, tasks) for (board_id, (name, tasks)) in boards.items()]
+        for board_id in list(self.columns):
+            if board_id not in boards:
+                self.columns.pop(board_id)
+        # only the rows fitting the screen are formatted (the last line is kept for the cursor)
+        max_lines = max(size[0] - 1, 1)
+        self.draw(get_table_lines(columns, [cells.get_width() for cells in columns], size[1], max_lines))
+
+    def draw(self, lines):
         output = []
-        for board_id in boards:
-            if i >= len(boards[board_id]['tasks']):
-                output.append('')
-            else:
-                task = boards[board_id]['tasks'][i]
-                if mode.lower() == 'minimal' or mode.lower() == 'mini':
-                    output.append('%s. %s' %(task['id'], task['name']))
-                else:
-                    output.append('%s. %s %s' %(task['id'], task['name'], task['remind_on']))
-        outputs.append(output)
-    # print outputs
-    print_table(outputs)
+        for (index, line) in enumerate(lines):
+            old_line = self.lines[index] if index < len(self.lines) else ''
+            if line == old_line:
+                continue
+            start = len(os.path.commonprefix([line, old_line]))
+            stop = len(line)
+            if len(line) == len(old_line): # skip the unchanged end as well
+                while stop > start and line[stop - 1] == old_line[stop - 1]:
+                    stop -= 1
+            output.append('\033[%d;%dH%s' %(index + 1, start + 1, line[start:stop]))
+            if len(line) < len(old_line):
+                output.append('\033[K')
+        for index in range(len(lines), len(self.lines)): # lines that are gone
+            output.append('\033[%d;1H\033[K' %(index + 1,))
+        self.lines = lines
+        output.append('\033[%d;1H' %(len(lines) + 1,))
+        self.outfile.write(''.join(output))
+        self.outfile.flush()
+
+def watch_kanban(arg_dict={}):
+    '''
+    Keep kanban on the screen, redraw it when the kanban (by inotify, or by checking it's mtime) or the terminal size is changed
+    '''
+    storage = open_storage(arg_dict.get('kanban'), merged = True)
+    if storage is None:
+        return
+    filters = get_task_filters(storage, arg_dict)
+    if filters is None:
+        return
+    watcher = enable_file_watcher()
+    if watcher is not None:
+        for file_name in storage.get_file_names():
+            watcher.watch(file_name)
+    view = KanbanView(arg_dict.get('view', ''))
+    signature = None
+    sys.stdout.write('\033[?25l') # hide cursor
+    try:
+        while True:
+            if watcher is not None:
+                poll_file_watcher()
+            if storage.get_signature() != signature or get_terminal_size() != view.size:
+                signature = storage.get_signature()
+                storage.reload()
+                view.update(get_kanban_board_tasks(storage, filters), get_terminal_size())
+            wait_for_input([watcher.fd] if watcher is not None else [], KANBAN_WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stdout.write('\033[?25h\n') # show cursor
+
+def load_status_snapshot():
+    try:
+        with open(STATUS_FILE, 'r') as infile:
+            return json.load(infile)
+    except (IOError, OSError, ValueError): # not exists or being corrupted
+        return {}
+
+def update_status_snapshot(values):
+    '''
+    Merge values into STATUS_FILE. The file is replaced atomically, so that status never read half written snapshot
+    '''
+    temporary_file_name = '%s.%d.tmp' %(STATUS_FILE, os.getpid())
+    try:
+        with FileLock(STATUS_FILE): # pomodoro and kanban changes update different keys
+            snapshot = load_status_snapshot()
+            snapshot.update(values)
+            with open(temporary_file_name, 'w') as outfile:
+                json.dump(snapshot, outfile)
+            os.rename(temporary_file_name, STATUS_FILE)
+    except (IOError, OSError): # status is not important enough to break the command
+        pass
+
+def get_kanban_status(storage, current_time=None):
+    '''
+    Precompute everything status needs from the kanban: task count per board and reminder windows of the next STATUS_REMINDER_WINDOW seconds
+    '''
+    current_time = time.time() if current_time is None else current_time
+    boards = storage.get_boards()
+    tasks = storage.get_tasks()
+    board_counts = collections.OrderedDict((id, 0) for id in sorted(boards, key = lambda key: int(key)))
+    reminders = []
+    for (id, task) in tasks:
+        if task.board in board_counts:
+            board_counts[task.board] += 1
+        rule = compile_remind_on(task.remind_on)
+        if rule is not None:
+            for (time_start, time_stop) in rule.iter_occurrences(current_time, current_time + STATUS_REMINDER_WINDOW, float(task.remind_for)):
+                reminders.append([time_start, time_stop, task.name])
+    return {
+            'board_counts' : [[boards[id], board_counts[id]] for id in board_counts],
+            'reminders' : sorted(reminders),
+            'valid_until' : current_time + STATUS_REMINDER_WINDOW
+        }
+
+def get_pomodoro_status(timer, current_time):
+    return {
+            'state' : timer.state,
+            'paused' : timer.paused,
+            'remaining' : timer.get_remaining(current_time),
+            'deadline' : time.time() + timer.get_remaining(current_time)
+        }
+
+def status(arg_dict={}):
+    current_time = time.time()
+    snapshot = load_status_snapshot()
+    configuration = load_configuration()
+    # kanban changes don't update the snapshot, status only shows the default kanban and notices it's changes by it's signature
+    kanban_signature = get_file_signature(get_kanban_file_name(DEFAULT_KANBAN_NAME, configuration['storage']))
+    kanban_signature = list(kanban_signature) if kanban_signature is not None else None
+    if snapshot.get('valid_until', 0) < current_time or snapshot.get('kanban_signature') != kanban_signature:
+        # reminder windows are outdated, or the kanban has been changed since they were computed
+        snapshot.update(get_kanban_status(open_storage(), current_time))
+        snapshot['kanban_signature'] = kanban_signature
+        update_status_snapshot(snapshot)
+    # pomodoro
+    state = snapshot.get('state', 'idle')
+    remaining = snapshot.get('remaining', 0) if snapshot.get('paused', False) else snapshot.get('deadline', 0) - current_time
+    if state != 'idle' and remaining < -1: # pomodoro is not running anymore
+        state = 'idle'
+    if state == 'idle':
+        counter = ''
+    else:
+        counter = get_formatted_counter(max(math.ceil(remaining), 0))
+    # reminders
+    reminders = [name for (time_start, time_stop, name) in snapshot.get('reminders', []) if time_start <= current_time < time_stop]
+    board_counts = snapshot.get('board_counts', [])
+    fields = {
+            'state' : state.upper() + (' (paused)' if state != 'idle' and snapshot.get('paused', False) else ''),
+            'counter' : counter,
+            'reminders' : ', '.join(reminders),
+            'reminder_count' : len(reminders),
+            'board_counts' : ' '.join('%s:%d' %(name, count) for (name, count) in board_counts),
+            'task_count' : sum(count for (name, count) in board_counts)
+        }
+    status_format = arg_dict['format'] if 'format' in arg_dict else configuration['status_format']
+    try:
+        print(status_format.format(**fields).strip())
+    except (KeyError, IndexError, ValueError) as e:
+        print_error('Invalid status format: %s' %(e,))
+
+def append_session_event(event, task_id=0, current_time=None):
+    '''
+    Append a fixed-width record (SESSION_RECORD) to SESSION_LOG_FILE. A single small write with O_APPEND never interleaves with other writers,
+    the lock of the rollups is taken so that the record isn't lost while compact_session_log replaces the log
+    '''
+    current_time = time.time() if current_time is None else current_time
+    record = SESSION_RECORD.pack(current_time, SESSION_EVENTS.index(event) + 1, int(task_id) if str(task_id).isdigit() else 0)
+    try:
+        with FileLock(SESSION_ROLLUP_FILE):
+            fd = os.open(SESSION_LOG_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, record)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size >= SESSION_LOG_MAX_SIZE:
+                update_session_rollups(rotate = True)
+    except (IOError, OSError): # history is not important enough to break pomodoro
+        pass
+
+def iter_session_events(time_from=None, time_to=None):
+    '''
+    Yield (timestamp, event, task id) between time_from and time_to from the rotated and the current log.
+    Records are ordered by time, so the log is mapped into memory and the first record is found by bisection
+    '''
+    import mmap
+    record_size = SESSION_RECORD.size
+    for file_name in (SESSION_LOG_FILE + '.1', SESSION_LOG_FILE):
+        try:
+            infile = open(file_name, 'rb')
+        except (IOError, OSError):
+            continue
+        with infile:
+            count = os.fstat(infile.fileno()).st_size // record_size
+            if count == 0:
+                continue
+            data = mmap.mmap(infile.fileno(), count * record_size, access = mmap.ACCESS_READ)
+            try:
+                (low, high) = (0, count)
+                while time_from is not None and low < high:
+                    middle = (low + high) // 2
+                    if SESSION_RECORD.unpack_from(data, middle * record_size)[0] < time_from:
+                        low = middle + 1
+                    else:
+                        high = middle
+                for index in range(low, count):
+                    (timestamp, code, task_id) = SESSION_RECORD.unpack_from(data, index * record_size)
+                    if time_to is not None and timestamp >= time_to:
+                        return
+                    if 0 < code <= len(SESSION_EVENTS):
+                        yield (timestamp, SESSION_EVENTS[code - 1], task_id)
+            finally:
+                data.close()
+
+def add_session_interval(rollups, state, time_start, time_stop, task_id):
+    '''
+    Add [time_start, time_stop) of state (work/rest) to the daily and weekly rollups, split at midnight
+    '''
+    while time_start < time_stop:
+        date = datetime.date.fromtimestamp(time_start)
+        (day_start, day_length) = get_day_start(date)
+        time_end = min(time_stop, day_start + day_length)
+        week = '%04d-W%02d' %date.isocalendar()[:2]
+        for totals in (rollups['days'].setdefault(date.isoformat(), {}), rollups['weeks'].setdefault(week, {})):
+            totals[state] = totals.get(state, 0) + (time_end - time_start)
+            if state == 'work' and task_id:
+                task_totals = totals.setdefault('tasks', {})
+                task_totals[str(task_id)] = task_totals.get(str(task_id), 0) + (time_end - time_start)
+        time_start = time_end
+
+def fold_session_event(rollups, timestamp, event, task_id, durations):
+    '''
+    Apply one log record to rollups. rollups['current'] is the running session: state, since, paused, and task
+    '''
+    current = rollups['current']
+    if current['state'] in durations and not current['paused'] and current['since'] is not None:
+        # a session can't be longer than it's duration (e.g: pomodoro was killed without logging stop)
+        time_stop = min(timestamp, current['since'] + durations[current['state']])
+        add_session_interval(rollups, current['state'], current['since'], time_stop, current['task'])
+    current['since'] = timestamp
+    if event in ('work', 'rest'):
+        (current['state'], current['paused']) = (event, False)
+        if event == 'work':
+            for totals in (rollups['days'].setdefault(datetime.date.fromtimestamp(timestamp).isoformat(), {}),
+                    rollups['weeks'].setdefault('%04d-W%02d' %datetime.date.fromtimestamp(timestamp).isocalendar()[:2], {})):
+                totals['sessions'] = totals.get('sessions', 0) + 1
+    elif event == 'pause':
+        current['paused'] = True
+    elif event == 'resume':
+        current['paused'] = False
+    elif event == 'stop':
+        (current['state'], current['task']) = (None, 0)
+    elif event == 'task':
+        current['task'] = task_id
+
+def load_session_rollups():
+    try:
+        with open(SESSION_ROLLUP_FILE, 'r') as infile:
+            rollups = json.load(infile)
+    except (IOError, OSError, ValueError): # not exists or corrupted
+        rollups = {}
+    if not is_dict(rollups) or not all(key in rollups for key in ('offset', 'current', 'days', 'weeks')):
+        rollups = {'offset' : 0, 'current' : {'state' : None, 'since' : None, 'paused' : False, 'task' : 0}, 'days' : {}, 'weeks' : {}}
+    return rollups
+
+def update_session_rollups(rotate=False):
+    '''
+    Fold records appended since the last call into SESSION_ROLLUP_FILE, so that stats never re-read the whole log.
+    If rotate is True, the log is moved to SESSION_LOG_FILE + '.1' (replacing the older one) afterward
+    '''
+    configuration = load_configuration()
+    durations = {'work' : float(configuration['work_time']), 'rest' : float(configuration['rest_time'])}
+    with FileLock(SESSION_ROLLUP_FILE):
+        rollups = load_session_rollups()
+        record_size = SESSION_RECORD.size
+        if os.path.exists(SESSION_LOG_FILE):
+            with open(SESSION_LOG_FILE, 'rb') as infile:
+                size = os.fstat(infile.fileno()).st_size
+                if size < rollups['offset']: # the log has been replaced
+                    rollups['offset'] = 0
+                infile.seek(rollups['offset'])
+                data = infile.read((size - rollups['offset']) // record_size * record_size)
+            for offset in range(0, len(data), record_size):
+                (timestamp, code, task_id) = SESSION_RECORD.unpack_from(data, offset)
+                if 0 < code <= len(SESSION_EVENTS):
+                    fold_session_event(rollups, timestamp, SESSION_EVENTS[code - 1], task_id, durations)
+            rollups['offset'] += len(data)
+            if rotate and size >= SESSION_LOG_MAX_SIZE: # not rotated yet by another process
+                os.rename(SESSION_LOG_FILE, SESSION_LOG_FILE + '.1')
+                rollups['offset'] = 0
+        save_json_file(SESSION_ROLLUP_FILE, rollups)
+    return rollups
+
+def compact_session_log(keep_days):
+    '''
+    Drop records older than keep_days from the logs, their durations are already kept by the rollups
+    '''
+    time_from = time.time() - keep_days * 24 * 60 * 60
+    with FileLock(SESSION_ROLLUP_FILE):
+        rollups = update_session_rollups()
+        records = [SESSION_RECORD.pack(timestamp, SESSION_EVENTS.index(event) + 1, task_id) for (timestamp, event, task_id) in iter_session_events(time_from)]
+        temporary_file_name = '%s.%d.tmp' %(SESSION_LOG_FILE, os.getpid())
+        with open(temporary_file_name, 'wb') as outfile:
+            outfile.write(b''.join(records))
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.rename(temporary_file_name, SESSION_LOG_FILE)
+        if os.path.exists(SESSION_LOG_FILE + '.1'):
+            os.remove(SESSION_LOG_FILE + '.1')
+        rollups['offset'] = len(records) * SESSION_RECORD.size
+        save_json_file(SESSION_ROLLUP_FILE, rollups)
+    return len(records)
+
+def stats(arg_dict={}):
+    '''
+    Show focused (work) minutes, rest minutes, and work sessions per day (or per week) from the rollups
+    '''
+    if arg_dict.get('compact', False) == True:
+        keep_days = int(arg_dict.get('keep', SESSION_LOG_KEEP_DAYS))
+        print('%d records are kept' %(compact_session_log(keep_days),))
+        return
+    if arg_dict.get('log', False) == True: # raw events
+        time_from = get_agenda_time(arg_dict.get('from'), time.time() - 24 * 60 * 60)
+        time_to = get_agenda_time(arg_dict.get('to'), time.time())
+        if time_from is None or time_to is None:
+            print_error('Invalid from/to: %s - %s' %(arg_dict.get('from', ''), arg_dict.get('to', '')))
+            return
+        for (timestamp, event, task_id) in iter_session_events(time_from, time_to):
+            print('%s \t %s \t %s' %(timestamp_to_str(timestamp), event, task_id if task_id else ''))
+        return
+    current_time = time.time()
+    rollups = update_session_rollups()
+    # count the running session as well
+    current = rollups['current']
+    if current['state'] is not None and not current['paused'] and current['since'] is not None:
+        configuration = load_configuration()
+        duration = float(configuration['%s_time' %(current['state'],)])
+        add_session_interval(rollups, current['state'], current['since'], min(current_time, current['since'] + duration), current['task'])
+    today = datetime.date.fromtimestamp(current_time)
+    by = arg_dict.get('by', 'day')
+    if by == 'week':
+        weeks = int(arg_dict.get('weeks', 4))
+        keys = ['%04d-W%02d' %(today - datetime.timedelta(7 * i)).isocalendar()[:2] for i in range(weeks - 1, -1, -1)]
+        totals = rollups['weeks']
+    else:
+        days = int(arg_dict.get('days', 7))
+        keys = [(today - datetime.timedelta(i)).isoformat() for i in range(days - 1, -1, -1)]
+        totals = rollups['days']
+    if by == 'task': # work minutes of every task within the days
+        task_totals = {}
+        for key in keys:
+            for (task_id, seconds) in totals.get(key, {}).get('tasks', {}).items():
+                task_totals[task_id] = task_totals.get(task_id, 0) + seconds
+        storage = open_storage(arg_dict.get('kanban'))
+        if storage is None:
+            return
+        task_map = storage.get_task_map()
+        for task_id in sorted(task_totals, key = lambda key: -task_totals[key]):
+            task_name = task_map[task_id].name if task_id in task_map else ''
+            print('%s. \t %s \t %4d min work' %(task_id, task_name, task_totals[task_id] // 60))
+        return
+    for key in keys:
+        total = totals.get(key, {})
+        print('%s \t %4d min work \t %4d min rest \t %3d sessions' %(key, total.get('work', 0) // 60, total.get('rest', 0) // 60, total.get('sessions', 0)))
 
 def pomodoro(arg_dict={}):
     config = load_configuration()
-    kanban = load_kanban()
-    old_reminded_task_list = {}
-    paused = False
-    play_alarm = True
-    alarm_ring = False
+    storage = open_storage(arg_dict.get('kanban'), merged = True)
+    if storage is None:
+        return
+    watcher = enable_file_watcher()
+    if watcher is not None:
+        for file_name in storage.get_file_names():
+            watcher.watch(file_name)
+    kanban_signature = storage.get_signature()
+    schedule = ReminderSchedule()
+    schedule.update(storage.get_task_map())
+    dispatcher = NotificationDispatcher(create_notification_sinks(config))
+    notified_tasks = set()
     play_tick = config['play_tick']
-    state = 'work'
-    counter = config['work_time']
-    small_counter = 0
+    timer = PomodoroTimer(config['work_time'], config['rest_time'])
+    next_boundary = monotonic_time()
+    status_key = None
+    session_key = None
+    task_id = str(arg_dict.get('task', '')) # the task worked on, for stats by:task
+    if task_id != '':
+        append_session_event('task', task_id)
     # get fd etc
     fd = sys.stdin.fileno()
     oldterm = termios.tcgetattr(fd)
     newattr = termios.tcgetattr(fd)
     newattr[3] = newattr[3] & ~termios.ICANON & ~termios.ECHO
     termios.tcsetattr(fd, termios.TCSANOW, newattr)
-    oldflags = fcntl.fcntl(fd, fcntl.F_GETFL)
-    fcntl.fcntl(fd, fcntl.F_SETFL, oldflags | os.O_NONBLOCK)
     try:
         print '(q) Quit  (t) Toggle Mode  (space) Pause/Resume'
         print '(k) Toggle tick  (r) Reload  (s) Turn Off Alarm'
-        while True:
+        running = True
+        while running:
             try:
-                # small counter is used to make the system more responsive
-                time.sleep(0.1)
-                small_counter += 1
-                if small_counter == 10:
-                    small_counter = 0
-                    if not paused:
-                        counter -= 1
-                        if counter == 0:
-                            switch_beep()
-                            # Switch state
-                            state = 'work' if state == 'rest' else 'rest'
-                            counter = config[state + '_time']
-                    if play_alarm and alarm_ring:
-                        alarm_beep()
-                    elif play_tick and state == 'work' and not paused:
+                now = monotonic_time()
+                if PROFILE_ENABLED:
+                    iteration_start = timeit.default_timer()
+                    if now >= next_boundary + PROFILE_OVERRUN_THRESHOLD:
+                        profile_count('pomodoro_overrun')
+                # things that should be done every second
+                if now >= next_boundary:
+                    if timer.update(now) > 0:
+                        switch_beep()
+                    if play_tick and timer.state == 'work' and not timer.paused:
                         tick_beep()
-                # show tasks
-                new_reminded_task_list = get_reminded_tasks()
-                if new_reminded_task_list != old_reminded_task_list:
-                    old_reminded_task_list = new_reminded_task_list
-                    alarm_ring = True
-                    for task_id in old_reminded_task_list:
-                        task_name = old_reminded_task_list[task_id]['name']
-                        print('\r * %s\n' %(task_name,))
+                    next_boundary = timer.get_next_boundary(now)
+                # only rebuild the schedule if kanban has been changed
+                if watcher is not None:
+                    poll_file_watcher()
+                if storage.get_signature() != kanban_signature:
+                    kanban_signature = storage.get_signature()
+                    storage.reload()
+                    schedule.update(storage.get_task_map())
+                # notify tasks once, when their reminder starts
+                if schedule.tick():
+                    for id in schedule.active_tasks:
+                        if id not in notified_tasks:
+                            dispatcher.notify(id, schedule.active_tasks[id].name)
+                    notified_tasks = set(schedule.active_tasks)
+                # let status know about the new state
+                if status_key != (timer.state, timer.paused, timer.deadline):
+                    status_key = (timer.state, timer.paused, timer.deadline)
+                    update_status_snapshot(get_pomodoro_status(timer, now))
+                # log the transition for stats
+                if session_key != (timer.state, timer.paused):
+                    if session_key is None or session_key[0] != timer.state:
+                        append_session_event(timer.state)
+                        if timer.paused:
+                            append_session_event('pause')
+                    else:
+                        append_session_event('pause' if timer.paused else 'resume')
+                    session_key = (timer.state, timer.paused)
                 # show pomodoro
                 localtime   = time.localtime()
                 time_string  = time.strftime('%a, %b %d, %H:%M', localtime)
-                output = '\r' + time_string + ' | \033[1;37m' + state.upper() + '\033[0;0m ' + get_formatted_counter(counter)
+                output = '\r' + time_string + ' | \033[1;37m' + timer.state.upper() + '\033[0;0m ' + get_formatted_counter(timer.get_counter(now))
                 if get_terminal_col_size() > 35:
                     sys.stdout.write(output.ljust(35, ' '))
                 else:
                     sys.stdout.write('\r')
                 sys.stdout.flush()
+                # sleep until the next second boundary, reminder event, kanban change, or user input
+                timeout = next_boundary - monotonic_time()
+                next_event_time = schedule.get_next_event_time()
+                if next_event_time is not None:
+                    timeout = min(timeout, next_event_time - time.time())
+                if PROFILE_ENABLED:
+                    profile_sample('pomodoro_iteration', timeit.default_timer() - iteration_start)
+                readable = wait_for_input([fd] + ([watcher.fd] if watcher is not None else []), timeout)
+                if fd not in readable:
+                    continue
                 # read user input
-                try:
-                    user_input = sys.stdin.read(1)
+                user_inputs = os.read(fd, 32).decode('utf-8', 'ignore')
+                if user_inputs == '': # stdin is closed
+                    break
+                now = monotonic_time()
+                for user_input in user_inputs:
                     if user_input == ' ': # Pause/resume
-                        paused = not paused
+                        timer.toggle_pause(now)
                     elif user_input == 'q': # Close
-                        break
+                        running = False
                     elif user_input == 't': # Switch state
-                        state = 'work' if state == 'rest' else 'rest'
-                        counter = config[state + '_time']
+                        timer.switch_state(now)
                     elif user_input == 'r': # Reload kanban
-                        kanban = load_kanban()
+                        storage.reload()
+                        schedule.update(storage.get_task_map())
                     elif user_input == 's': # Turn off alarm
-                        play_alarm = False
+                        dispatcher.disabled.add('sound')
                     elif user_input == 'k':
                         play_tick = not play_tick
-                except IOError:
-                    pass
+                next_boundary = timer.get_next_boundary(now)
             except(KeyboardInterrupt):
                 break
     finally:
         termios.tcsetattr(fd, termios.TCSAFLUSH, oldterm)
-        fcntl.fcntl(fd, fcntl.F_SETFL, oldflags)
+        update_status_snapshot({'state' : 'idle'})
+        append_session_event('stop')
+        dispatcher.close()
     print('')
 
+PROFILE_ENABLED = False
+PROFILE_TIMERS = {} # name : [count, total seconds]
+PROFILE_COUNTERS = {} # name : count
+PROFILE_SAMPLES = {} # name : list of seconds
+
+def profile_time(name, seconds):
+    timer = PROFILE_TIMERS.get(name)
+    if timer is None:
+        timer = PROFILE_TIMERS[name] = [0, 0.0]
+    timer[0] += 1
+    timer[1] += seconds
+
+def profile_count(name, count=1):
+    PROFILE_COUNTERS[name] = PROFILE_COUNTERS.get(name, 0) + count
+
+def profile_sample(name, seconds):
+    PROFILE_SAMPLES.setdefault(name, []).append(seconds)
+    profile_time(name, seconds)
+
+def instrument(function, name):
+    def instrumented_function(*args, **kwargs):
+        start = timeit.default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile_time(name, timeit.default_timer() - start)
+    instrumented_function.__name__ = function.__name__
+    instrumented_function.__doc__ = function.__doc__
+    return instrumented_function
+
+def enable_profiling():
+    '''
+    Wrap every PROFILED_FUNCTIONS with a timer and report on exit. Nothing is wrapped unless profiling is enabled,
+    so there is no cost when it is off
+    '''
+    global PROFILE_ENABLED
+    if PROFILE_ENABLED:
+        return
+    PROFILE_ENABLED = True
+    module_globals = globals()
+    for name in PROFILED_FUNCTIONS:
+        if '.' in name:
+            (class_name, method_name) = name.split('.')
+            owner = module_globals[class_name]
+            setattr(owner, method_name, instrument(getattr(owner, method_name), name))
+        else:
+            module_globals[name] = instrument(module_globals[name], name)
+    atexit.register(print_profile_report)
+
+def get_percentile(sorted_samples, percentile):
+    return sorted_samples[int(round(percentile * (len(sorted_samples) - 1)))]
+
+def print_profile_report(outfile=None):
+    outfile = sys.stderr if outfile is None else outfile
+    outfile.write('\nPROFILE\n')
+    for name in sorted(PROFILE_TIMERS, key = lambda key: -PROFILE_TIMERS[key][1]):
+        (count, total) = PROFILE_TIMERS[name]
+        outfile.write('  %s calls: %-8d total: %.6fs  mean: %.6fs\n' %(name.ljust(28), count, total, total / count))
+    for name in sorted(PROFILE_SAMPLES):
+        samples = sorted(PROFILE_SAMPLES[name])
+        outfile.write('  %s p50: %.6fs  p99: %.6fs  max: %.6fs\n' %(name.ljust(28), get_percentile(samples, 0.5), get_percentile(samples, 0.99), samples[-1]))
+    for name in sorted(PROFILE_COUNTERS):
+        outfile.write('  %s %d\n' %(name.ljust(28), PROFILE_COUNTERS[name]))
+
+def get_profile_mode(arg_dict):
+    '''
+    Return False, True, or 'cprofile' based on profile argument or PROFILE_ENVIRONMENT_VARIABLE
+    '''
+    mode = arg_dict.pop('profile', os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, False))
+    if is_string_or_unicode(mode):
+        mode = mode.lower()
+        return 'cprofile' if mode == 'cprofile' else mode not in ('', '0', 'false', 'no')
+    return mode == True
+
+def run_command(command, arg_string):
+    arg_dict = str_as_dictionary(arg_string) # turn arguments into dictionary
+    profile_mode = get_profile_mode(arg_dict)
+    if profile_mode:
+        enable_profiling()
+    if profile_mode == 'cprofile':
+        import cProfile, pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(command_list[command], arg_dict)
+        if 'profile_output' in arg_dict:
+            profiler.dump_stats(str(arg_dict['profile_output']))
+        else:
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+        return
+    command_list[command](arg_dict) # run the command
+
+def connect_to_daemon():
+    '''
+    Return socket connected to the running daemon, or None if there is no daemon
+    '''
+    if not os.path.exists(DAEMON_SOCKET_FILE):
+        return None
+    import socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(DAEMON_TIMEOUT)
+    try:
+        client.connect(DAEMON_SOCKET_FILE)
+    except socket.error: # stale socket file
+        client.close()
+        return None
+    return client
+
+def is_local_command(command, arg_string):
+    # commands that keep running (e.g: kanban mode:watch) can't be answered by the daemon
+    return command in LOCAL_COMMANDS or str(str_as_dictionary(arg_string).get('mode', '')).lower() == 'watch'
+
+def send_to_daemon(command, arg_string):
+    '''
+    Run the command in the running daemon and print it's output. Return False if there is no daemon
+    '''
+    client = connect_to_daemon() if not is_local_command(command, arg_string) else None
+    if client is None:
+        return False
+    try:
+        (rows, cols) = get_terminal_size()
+        request = '%s\t%s\t%d\t%d\n' %(command, arg_string.replace('\t', ' ').replace('\n', ' '), rows, cols)
+        client.sendall(request.encode('utf-8') if not isinstance(request, bytes) else request)
+        while True:
+            response = client.recv(65536)
+            if not response:
+                break
+            if hasattr(sys.stdout, 'buffer'):
+                sys.stdout.buffer.write(response)
+            else:
+                sys.stdout.write(response)
+        sys.stdout.flush()
+    finally:
+        client.close()
+    return True
+
+def handle_daemon_request(connection):
+    request = b''
+    while not request.endswith(b'\n'):
+        data = connection.recv(65536)
+        if not data:
+            return
+        request += data
+    (command, arg_string, rows, cols) = request.decode('utf-8').rstrip('\n').split('\t')
+    global TERMINAL_SIZE
+    old_stdout = sys.stdout
+    sys.stdout = StringIO()
+    TERMINAL_SIZE = (int(rows), int(cols)) # client's terminal
+    try:
+        if command in command_list and not is_local_command(command, arg_string):
+            run_command(command, arg_string)
+        else:
+            help()
+    except Exception:
+        import traceback
+        traceback.print_exc(file=sys.stdout)
+    finally:
+        (output, sys.stdout) = (sys.stdout.getvalue(), old_stdout)
+        TERMINAL_SIZE = None
+    connection.sendall(output.encode('utf-8') if not isinstance(output, bytes) else output)
+
+def daemon(arg_dict={}):
+    '''
+    Keep kanban, configuration, and reminder schedule in memory, and serve other commands through DAEMON_SOCKET_FILE
+    '''
+    import socket
+    client = connect_to_daemon()
+    if client is not None:
+        client.close()
+        print('Daemon is already running')
+        return
+    if os.path.exists(DAEMON_SOCKET_FILE):
+        os.remove(DAEMON_SOCKET_FILE)
+    enable_file_watcher()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(DAEMON_SOCKET_FILE)
+    server.listen(16)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0)) # clean up the socket file on kill
+    print('Listening on %s' %(DAEMON_SOCKET_FILE,))
+    try:
+        while True:
+            try:
+                (connection, address) = server.accept()
+            except socket.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            try:
+                connection.settimeout(DAEMON_TIMEOUT)
+                handle_daemon_request(connection)
+            except (socket.error, ValueError): # broken client or request
+                pass
+            finally:
+                connection.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(DAEMON_SOCKET_FILE)
+
+def generate_synthetic_kanban(task_count, board_count=4, styles=BENCH_REMIND_ON_STYLES, seed=0):
+    '''
+    Generate kanban dictionary with task_count tasks spread over board_count boards, remind_on styles are used round-robin
+    '''
+    import random
+    generator = random.Random(seed)
+    boards = {str(id) : 'Board %d' %(id,) for id in range(1, board_count + 1)}
+    tasks = {}
+    for id in range(1, task_count + 1):
+        style = styles[id % len(styles)]
+        (hour, minute) = (generator.randint(0, 23), generator.randint(0, 59))
+        if style == 'once':
+            remind_on = '%04d-%02d-%02d %02d:%02d' %(generator.randint(2016, 2030), generator.randint(1, 12), generator.randint(1, 28), hour, minute)
+        elif style == 'daily':
+            remind_on = 'everyday %02d:%02d' %(hour, minute)
+        elif style == 'weekly':
+            remind_on = '%s %02d:%02d' %(generator.choice(DAYS)[generator.randint(0, 1)], hour, minute)
+        elif style == 'star':
+            remind_on = '*-%s-%02d %02d:%02d' %(generator.choice(('*', '%02d' %(generator.randint(1, 12),))), generator.randint(1, 28), hour, minute)
+        else:
+            remind_on = ''
+        tasks[str(id)] = {
+                'name' : 'task %d' %(id,),
+                'board' : str(generator.randint(1, board_count)),
+                'remind_on' : remind_on,
+                'remind_for' : generator.choice((5 * 60, 30 * 60, 60 * 60))
+            }
+    return {'tasks' : tasks, 'boards' : boards}
+
+def get_benchmarks():
+    '''
+    Return list of (name, function) timing the hot paths against KANBAN_FILE.
+    Each function can also be passed to pytest-benchmark's benchmark fixture
+    '''
+    def clear_caches():
+        # the snapshot and offsets files are caches as well, kanban.json is parsed again without them
+        for file_name in (get_kanban_snapshot_file_name(KANBAN_FILE), get_kanban_offsets_file_name(KANBAN_FILE)):
+            if os.path.exists(file_name):
+                os.remove(file_name)
+        JSON_FILE_CACHE.clear()
+        REMINDER_RULE_CACHE.clear()
+        REMINDER_SCHEDULES.clear()
+    def bench_load_kanban():
+        clear_caches()
+        load_kanban()
+    def bench_load_kanban_snapshot():
+        # the snapshot is written by every load of kanban.json (e.g: the one of get_benchmarks)
+        JSON_FILE_CACHE.clear()
+        load_kanban()
+    def bench_load_kanban_cached():
+        load_kanban()
+    def bench_get_reminded_tasks():
+        clear_caches()
+        get_reminded_tasks()
+    def bench_complete_str_timestamp():
+        REMINDER_RULE_CACHE.clear()
+        for task in tasks.values():
+            complete_str_timestamp(task.remind_on)
+    def bench_str_as_dictionary():
+        for i in range(1000):
+            str_as_dictionary('id:%d, name:my "task" %d, board:to do, remind_on:tuesday 10:00, remind_for:1800' %(i, i))
+    def bench_kanban():
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            kanban({'mode' : 'mini'})
+        finally:
+            sys.stdout = old_stdout
+    def bench_pomodoro_minute():
+        # what pomodoro does on each of 60 second boundaries, without sleeping and playing sound
+        storage = open_storage()
+        schedule = ReminderSchedule()
+        schedule.update(storage.get_task_map())
+        timer = PomodoroTimer(25 * 60, 5 * 60, current_time=0)
+        output = StringIO()
+        now = time.time()
+        for second in range(60):
+            timer.update(second)
+            if storage.get_signature() is None:
+                break
+            schedule.tick(now + second)
+            schedule.get_next_event_time()
+            output.write(time.strftime('%a, %b %d, %H:%M', time.localtime(now + second)) + ' | ' + timer.state.upper() + ' ' + get_formatted_counter(timer.get_counter(second)))
+    tasks = load_kanban().tasks
+    return [
+            ('load_kanban', bench_load_kanban),
+            ('load_kanban_snapshot', bench_load_kanban_snapshot),
+            ('load_kanban_cached', bench_load_kanban_cached),
+            ('get_reminded_tasks', bench_get_reminded_tasks),
+            ('complete_str_timestamp', bench_complete_str_timestamp),
+            ('str_as_dictionary_x1000', bench_str_as_dictionary),
+            ('kanban', bench_kanban),
+            ('pomodoro_minute', bench_pomodoro_minute),
+        ]
+
+def bench(arg_dict={}):
+    '''
+    Time the hot paths against synthetic kanbans, print the result as JSON (or write it to output)
+    e.g: bench tasks:100 10000 1000000, boards:8, styles:none daily weekly, repeat:5, output:result.json
+    '''
+    import tempfile, shutil, platform
+    global CONFIGURATION_FILE, KANBAN_FILE, STATUS_FILE
+    task_counts = [int(x) for x in str(arg_dict.get('tasks', '100 1000 10000')).split()]
+    board_count = int(arg_dict.get('boards', 4))
+    styles = str(arg_dict.get('styles', ' '.join(BENCH_REMIND_ON_STYLES))).split()
+    repeat = max(int(arg_dict.get('repeat', 3)), 1)
+    old_files = (CONFIGURATION_FILE, KANBAN_FILE, STATUS_FILE)
+    directory = tempfile.mkdtemp(prefix='time-wizard-bench-')
+    results = []
+    try:
+        (CONFIGURATION_FILE, KANBAN_FILE, STATUS_FILE) = [os.path.join(directory, x) for x in ('config.json', 'kanban.json', 'status.json')]
+        save_json_file(CONFIGURATION_FILE, dict(DEFAULT_CONFIGURATION, storage = 'json', play_tick = False))
+        for task_count in task_counts:
+            save_json_file(KANBAN_FILE, generate_synthetic_kanban(task_count, board_count, styles))
+            JSON_FILE_CACHE.clear()
+            for (name, function) in get_benchmarks():
+                timings = []
+                for i in range(repeat):
+                    start = timeit.default_timer()
+                    function()
+                    timings.append(timeit.default_timer() - start)
+                results.append({'name' : name, 'tasks' : task_count, 'boards' : board_count, 'best' : min(timings), 'mean' : sum(timings) / len(timings), 'repeat' : repeat})
+                sys.stderr.write('%s\t%d tasks\t%.6fs\n' %(name.ljust(25), task_count, min(timings)))
+    finally:
+        (CONFIGURATION_FILE, KANBAN_FILE, STATUS_FILE) = old_files
+        JSON_FILE_CACHE.clear()
+        REMINDER_SCHEDULES.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+    report = {
+            'timestamp' : time.time(),
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'styles' : styles,
+            'results' : results
+        }
+    if 'output' in arg_dict:
+        save_json_file(str(arg_dict['output']), report)
+    else:
+        print(json.dumps(report, indent=2))
+
 def help(arg_dict={}):
     print('')
     print(' KANBAN & POMODORO')
     print('  * time-wizard.py kanban')
+    print('  * time-wizard.py kanban mode:watch')
+    print('  * time-wizard.py kanban page:2, page_size:50')
+    print('  * time-wizard.py kanban kanban:all')
+    print('  * time-wizard.py show-kanban')
+    print('  * time-wizard.py agenda from:2016-05-01, to:2016-06-01')
+    print('  * time-wizard.py stats by:day, days:365')
     print('  * time-wizard.py pomodoro')
+    print('  * time-wizard.py daemon')
+    print('  * time-wizard.py status format:{state} {counter} {reminders}')
     print('')
     print(' CONFIGURATION')
     print('  * time-wizard.py show-config')
     print('  * time-wizard.py edit-config key:value')
+    print('  * time-wizard.py migrate-kanban')
+    print('  * time-wizard.py migrate-kanban force:true')
+    print('')
+    print(' BENCHMARK')
+    print('  * time-wizard.py bench tasks:100 1000 10000, boards:4, repeat:3, output:result.json')
     print('')
     print(' BOARDS')
     print('  * time-wizard.py show-board')
@@ -583,39 +4159,60 @@ def help(arg_dict={}):
     print('')
     print(' TASKS')
     print('  * time-wizard.py show-task')
+    print('  * time-wizard.py show-task id:task-id')
+    print('  * time-wizard.py show-task board:board-name, name:word, due_after:2016-05-01, due_before:2016-06-01, has_reminder:true, offset:0, limit:10')
     print('  * time-wizard.py add-task key:value, key:value,...')
     print('  * time-wizard.py edit-task id:task-id, key:value,...')
     print('  * time-wizard.py delete-task id:task-id')
+    print('  * time-wizard.py import-tasks file:tasks.ndjson')
+    print('  * time-wizard.py export-tasks file:tasks.csv, board:board-name')
+    print('  * time-wizard.py batch file:commands.txt')
     print(' Available Keys: name, board, remind_on, remind_for ')
+    print('')
+    print(' Add "kanban:project-name" to any kanban, board, or task command to use a named kanban ("all" to view every kanban merged)')
+    print(' Add "profile:true" (or "profile:cprofile") to any command to see where the time goes')
 
 def test(arg_dict={}):
     print(complete_str_timestamp('Tuesday 15:00'))
     print(complete_str_timestamp('2016-09-09 11:10'))
     print(complete_str_timestamp('Wednesday 14:00'))
+    print(complete_str_timestamp('every 1st 08:00'))
     print(get_board_id(''))
     pass
 
+command_list = {
+        'add-task' : add_task,
+        'edit-task' : edit_task,
+        'delete-task' : delete_task,
+        'show-task' : show_task,
+        'add-board' : add_board,
+        'edit-board' : edit_board,
+        'delete-board' : delete_board,
+        'show-board' : show_board,
+        'edit-config' : edit_config,
+        'show-config' : show_config,
+        'kanban' : kanban,
+        'show-kanban' : show_kanban,
+        'agenda' : agenda,
+        'stats' : stats,
+        'migrate-kanban' : migrate_kanban,
+        'import-tasks' : import_tasks,
+        'export-tasks' : export_tasks,
+        'batch' : batch,
+        'pomodoro' : pomodoro,
+        'status' : status,
+        'daemon' : daemon,
+        'bench' : bench,
+        'help' : help,
+        'test' : test
+    }
+
 if __name__ == '__main__':
     command = sys.argv[1] if len(sys.argv) > 1 else '' # get command
-    command_list = {
-            'add-task' : add_task,
-            'edit-task' : edit_task,
-            'delete-task' : delete_task,
-            'show-task' : show_task,
-            'add-board' : add_board,
-            'edit-board' : edit_board,
-            'delete-board' : delete_board,
-            'show-board' : show_board,
-            'edit-config' : edit_config,
-            'show-config' : show_config,
-            'kanban' : kanban,
-            'pomodoro' : pomodoro,
-            'help' : help,
-            'test' : test
-        }
     if command in command_list:
         arg_string = ' '.join(sys.argv[2:]) # get arguments
-        arg_dict = str_as_dictionary(arg_string) # turn arguments into dictionary
-        command_list[command](arg_dict) # run the command
+        profiled = 'profile:' in arg_string or PROFILE_ENVIRONMENT_VARIABLE in os.environ # profile should be reported here
+        if profiled or not send_to_daemon(command, arg_string): # run in the daemon if it is running
+            run_command(command, arg_string)
     else:
         help()